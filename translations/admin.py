@@ -1,11 +1,15 @@
 from django.contrib import admin
+from django.conf import settings
 from django.conf.urls import patterns, url
 from django.forms import HiddenInput
 from django.forms.models import modelformset_factory
-from django.utils.translation import ungettext, ugettext_lazy
+from django.utils.translation import ugettext, ungettext, ugettext_lazy
 from models import Language, Translation
 from forms import BaseTranslationFormSet
-from views import TranslationMessagesView, GenerateTranslationMessagesView, TranslationMessagesEditView
+from jobs import get_po_path
+from stats import get_catalog_stats, get_total_stats
+from views import TranslationMessagesView, GenerateTranslationMessagesView, GenerationStatusView, TranslationMessagesEditView, \
+    TranslationMessageEntryView, TranslationMessagesBrowseView, get_app_catalogs
 
 class TranslationInline(admin.StackedInline):
     """
@@ -34,7 +38,7 @@ class LanguageAdmin(admin.ModelAdmin):
     """
     The default admin form for the :class:`translations,models.Language` model.
     """
-    list_display = ('name', 'default', 'order')
+    list_display = ('name', 'default', 'order', 'messages_stats')
     list_editable = ('order',)
     actions=['delete_selected_lang']
     fields = ('name', 'image', 'default', 'order')
@@ -50,10 +54,27 @@ class LanguageAdmin(admin.ModelAdmin):
         my_urls = patterns('',
             url(r'^(.+)/messages/$', self.admin_site.admin_view(TranslationMessagesView.as_view()), name="translations-messages-view"),
             url(r'^(.+)/messages/generate/$', self.admin_site.admin_view(GenerateTranslationMessagesView.as_view()), name="generate-translations-messages-view"),
+            url(r'^(.+)/messages/generate/status/$', self.admin_site.admin_view(GenerationStatusView.as_view()), name="generate-translations-messages-status-view"),
+            url(r'^(.+)/messages/browse/$', self.admin_site.admin_view(TranslationMessagesBrowseView.as_view()), name="translations-messages-browse-view"),
+            url(r'^(.+)/messages/([^/]+)/entry/$', self.admin_site.admin_view(TranslationMessageEntryView.as_view()), name="translations-message-entry-view"),
             url(r'^(.+)/messages/(.+)/$', self.admin_site.admin_view(TranslationMessagesEditView.as_view()), name="edit-translations-messages-view"),
         )
         return my_urls + urls
     
+    def messages_stats(self, obj):
+        """
+        Display the translation progress of the language's catalogs (see
+        :mod:`translations.stats`).
+        """
+        if not settings.LOCALE_PATHS:
+            return ''
+        po_path = get_po_path(obj.name)
+        stats = get_total_stats(get_catalog_stats(po_path, get_app_catalogs(po_path)))
+        if stats is None:
+            return ''
+        return ugettext('%(percent)d%% (%(translated)d translated, %(fuzzy)d fuzzy, %(untranslated)d untranslated)') % stats
+    messages_stats.short_description = ugettext_lazy('Translation messages')
+
     def has_delete_permission(self, request, obj=None):
         """
         Check if language is the default and deny deletion access if True.
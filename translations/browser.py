@@ -0,0 +1,113 @@
+"""
+An in-memory index of the messages of all application catalogs of a
+language, used to browse and search the messages without parsing the
+catalogs on every request.
+"""
+import os, threading
+from collections import namedtuple
+from pofile import POFileError, iter_entries
+
+#the status filters of the message browser
+UNTRANSLATED, FUZZY, CHANGED = 'untranslated', 'fuzzy', 'changed'
+
+Message = namedtuple('Message', 'po_file msgctxt msgid msgid_plural msgstr ' \
+                                'translated fuzzy changed')
+
+class CatalogIndex(object):
+    """
+    The messages of the catalog files of a folder. Each file is parsed
+    again only when its signature (modification time, size and inode)
+    changes, so building the index for an unchanged folder only costs a
+    ``stat`` per file.
+    """
+    def __init__(self, po_path):
+        self.po_path = po_path
+        self._files = {}
+        self._entries = []
+        self._by_status = {}
+        self._signatures = None
+        self._lock = threading.Lock()
+
+    def _get_signatures(self, po_files):
+        signatures = {}
+        for po_file in po_files:
+            try:
+                st = os.stat(os.path.join(self.po_path, po_file))
+            except OSError:
+                continue
+            signatures[po_file] = (st.st_mtime, st.st_size, st.st_ino)
+        return signatures
+
+    def _parse(self, po_file):
+        messages = []
+        try:
+            with open(os.path.join(self.po_path, po_file), 'rb') as f:
+                for entry in iter_entries(f, po_file):
+                    if entry.obsolete or entry.is_header:
+                        continue
+                    msgstr = entry.msgstr if entry.msgstr_plural is None \
+                                else u'\n'.join(entry.msgstr_plural)
+                    messages.append(Message(po_file, entry.msgctxt, entry.msgid, entry.msgid_plural,
+                                            msgstr, entry.translated, entry.fuzzy, entry.changed))
+        except (IOError, POFileError):
+            #invalid catalogs are not listed
+            pass
+        return messages
+
+    def refresh(self, po_files):
+        """
+        Update the index with the catalogs ``po_files`` (file names
+        relative to the folder of the index).
+        """
+        signatures = self._get_signatures(po_files)
+        with self._lock:
+            if signatures == self._signatures:
+                return
+            for po_file, signature in signatures.items():
+                if self._files.get(po_file, (None,))[0] != signature:
+                    self._files[po_file] = (signature, self._parse(po_file))
+
+            messages = [m for po_file in sorted(signatures) for m in self._files[po_file][1]]
+            #the lowercase text searched for each message
+            self._entries = [(u'\0'.join([m.msgid, m.msgid_plural or u'', m.msgstr, \
+                              m.msgctxt or u'']).lower(), m) for m in messages]
+            self._by_status = {
+                UNTRANSLATED : [e for e in self._entries if not e[1].translated],
+                FUZZY : [e for e in self._entries if e[1].fuzzy],
+                CHANGED : [e for e in self._entries if e[1].changed],
+            }
+            for po_file in set(self._files) - set(signatures):
+                del self._files[po_file]
+            self._signatures = signatures
+
+    def search(self, query=u'', status=None, po_file=None):
+        """
+        Return the list of messages whose msgid, plural msgid, translation
+        or context contains ``query`` (case insensitive), optionally
+        filtered by ``status`` (``'untranslated'``, ``'fuzzy'`` or
+        ``'changed'``) and catalog file name.
+        """
+        with self._lock:
+            entries = self._by_status.get(status, []) if status else self._entries
+
+        if po_file:
+            entries = [e for e in entries if e[1].po_file == po_file]
+        if query:
+            query = query.lower()
+            return [m for haystack, m in entries if query in haystack]
+        return [m for haystack, m in entries]
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_catalog_index(po_path, po_files):
+    """
+    Return the up to date :class:`translations.browser.CatalogIndex` of the
+    ``po_files`` catalogs in the ``po_path`` folder.
+    """
+    with _indexes_lock:
+        index = _indexes.get(po_path)
+        if index is None:
+            index = _indexes[po_path] = CatalogIndex(po_path)
+    index.refresh(po_files)
+    return index
@@ -0,0 +1,271 @@
+"""
+Bulk export and import of the :class:`translations.models.Translation`
+objects of a :class:`translations.models.Translatable` model, as JSON lines
+or CSV files.
+
+Each row holds the primary key of the translated object (``master``), the
+``language`` and the values of the translated fields. Rows are streamed in
+chunks both ways, so memory use does not depend on the number of rows.
+"""
+import csv, json
+from collections import OrderedDict
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, router, transaction
+from django.core.exceptions import ValidationError
+from django.db.models import FieldDoesNotExist
+from cache import invalidate_translations
+from models import Language
+
+FORMATS = ('jsonl', 'csv')
+CONFLICTS = ('update', 'skip', 'error')
+
+class ConflictError(Exception):
+    """
+    Raised when an imported row conflicts with an existing (or previously
+    imported) translation and the ``'error'`` conflict handling is used.
+    """
+    pass
+
+def get_translation_fields(model):
+    """
+    Return the translation model, the ``ForeignKey`` to the ``model``
+    :class:`translations.models.Translatable` and the list of the
+    exported fields of the translation model (all fields except the
+    primary key, the foreign key and the language).
+    """
+    try:
+        related = model._meta.get_field_by_name('translations')[0]
+    except FieldDoesNotExist:
+        raise ValueError('%s has no translations' % model._meta)
+    translation_model, master_field = related.model, related.field
+    fields = [f for f in translation_model._meta.fields \
+              if not f.primary_key and not f is master_field and f.name != 'language']
+    return translation_model, master_field, fields
+
+def _to_json(value):
+    if value is None or isinstance(value, (bool, int, long, float, basestring)):
+        return value
+    try:
+        return DjangoJSONEncoder().default(value)
+    except TypeError:
+        return unicode(value)
+
+def _to_csv(value):
+    value = _to_json(value)
+    return u'' if value is None else unicode(value)
+
+def export_translations(model, fileobj, format='jsonl', languages=None, chunk_size=1000):
+    """
+    Write the translations of ``model`` (optionally only those in
+    ``languages``) to ``fileobj`` and return the number of rows written.
+    Translations are read in chunks of ``chunk_size`` rows, ordered by
+    primary key.
+    """
+    translation_model, master_field, fields = get_translation_fields(model)
+    header = ['master', 'language'] + [f.attname for f in fields]
+    queryset = translation_model._default_manager.order_by('pk')
+    if languages:
+        queryset = queryset.filter(language__in=languages)
+    queryset = queryset.values_list(*(['pk', master_field.attname, 'language'] + [f.attname for f in fields]))
+
+    if format == 'csv':
+        writer = csv.writer(fileobj)
+        writer.writerow(header)
+        write = lambda row: writer.writerow([_to_csv(v).encode('utf-8') for v in row])
+    else:
+        write = lambda row: fileobj.write(json.dumps(dict(zip(header, [_to_json(v) for v in row]))) + '\n')
+
+    count, last = 0, None
+    while True:
+        chunk = list((queryset.filter(pk__gt=last) if last is not None else queryset)[:chunk_size])
+        for row in chunk:
+            write(row[1:])
+        count += len(chunk)
+        if len(chunk) < chunk_size:
+            break
+        last = chunk[-1][0]
+    return count
+
+def _check_names(names, translation_model, fields):
+    unknown = [n for n in names if not n in fields and not n in ('master', 'language')]
+    if unknown:
+        raise ValueError('%s has no field "%s"' % (translation_model._meta, unknown[0]))
+
+def _read_rows(fileobj, format, translation_model, fields):
+    if format == 'csv':
+        reader = csv.DictReader(fileobj)
+        header = [n.decode('utf-8') for n in reader.fieldnames or []]
+        missing = [n for n in ('master', 'language') if not n in header]
+        if missing:
+            raise ValueError('The file has no "%s" column' % '", "'.join(missing))
+        _check_names(header, translation_model, fields)
+        for row in reader:
+            yield dict([(k.decode('utf-8'), v.decode('utf-8') if v is not None else v) \
+                        for k, v in row.items() if k is not None]), True
+    else:
+        for line in fileobj:
+            if line.strip():
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError('Invalid row: %s' % line.strip())
+                _check_names(row.keys(), translation_model, fields)
+                yield row, False
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _check_conflict(conflict, model, key):
+    if conflict == 'error':
+        raise ConflictError('The %s translation of %s #%s already exists' % \
+                            (key[1], model._meta, key[0]))
+
+def _update_rows(model, fields, updates, using):
+    """
+    Update the ``model`` rows of ``updates``, a list of ``(pk, values)``
+    tuples, with a single ``UPDATE`` statement of ``CASE`` expressions
+    (per chunk of the rows the database accepts at once). Columns that
+    are missing from the ``values`` of a row are left untouched.
+    """
+    names = sorted(set([n for pk, values in updates for n in values]))
+    if not names:
+        return
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    pk_column = qn(model._meta.pk.column)
+    size = max(1, connection.ops.bulk_batch_size([None] * (2 * len(names) + 1), updates))
+
+    for start in range(0, len(updates), size):
+        chunk = updates[start:start + size]
+        assignments, params = [], []
+        for name in names:
+            column, cases = qn(fields[name].column), []
+            for pk, values in chunk:
+                if name in values:
+                    cases.append('WHEN %s THEN %s')
+                    params.extend([pk, fields[name].get_db_prep_save(values[name], connection=connection)])
+            if cases:
+                assignments.append('%s = CASE %s %s ELSE %s END' % (column, pk_column, ' '.join(cases), column))
+        params.extend([pk for pk, values in chunk])
+        connection.cursor().execute('UPDATE %s SET %s WHERE %s IN (%s)' % (qn(model._meta.db_table),
+                                    ', '.join(assignments), pk_column, ', '.join(['%s'] * len(chunk))), params)
+    transaction.set_dirty(using=using)
+
+def import_translations(model, fileobj, format='jsonl', conflict='update', batch_size=1000):
+    """
+    Import the translations of ``model`` from ``fileobj``. New translations
+    are inserted with ``bulk_create``, existing translations (with the same
+    ``master`` and ``language``) are updated, skipped or raise
+    :class:`translations.bulk.ConflictError` according to ``conflict``.
+
+    Rows are processed in transactions of ``batch_size`` rows, the updates
+    of a batch being applied with a single statement; the batches imported
+    before an error are not rolled back. Since the ``post_save``
+    signals are not sent, the cached translations and the translation
+    snapshots of the imported objects are updated after each batch.
+    Each row is validated with ``clean_fields()`` (new translations on all
+    fields, updates on the imported fields only). Returns a dictionary with
+    the number of ``created``, ``updated``, ``skipped`` and ``invalid`` rows
+    (rows of missing objects or languages and rows that do not validate);
+    rows repeating the translation of a previous row of the same batch are
+    merged in it and counted as updates once the translation is saved.
+    Unknown fields and CSV files without ``master`` and ``language`` columns
+    raise a ``ValueError``.
+    """
+    translation_model, master_field, fields = get_translation_fields(model)
+    fields = dict([(f.attname, f) for f in fields])
+    master_pk = model._meta.pk
+    languages = set(Language.objects.values_list('name', flat=True))
+    using = router.db_for_write(translation_model)
+    manager = translation_model._default_manager.db_manager(using)
+    result = {'created' : 0, 'updated' : 0, 'skipped' : 0, 'invalid' : 0}
+
+    for batch in _batches(_read_rows(fileobj, format, translation_model, fields), batch_size):
+        #the rows of the batch keyed by (master, language) and the number of rows merged in each
+        rows, merged = OrderedDict(), {}
+        for row, from_csv in batch:
+            values = {}
+            for name, value in row.items():
+                if name in ('master', 'language'):
+                    continue
+                if from_csv and value == u'' and fields[name].null:
+                    value = None
+                values[name] = value
+            try:
+                key = (master_pk.to_python(row.get('master')), row.get('language'))
+            except ValidationError:
+                result['invalid'] += 1
+                continue
+            if key[0] is None or key[1] is None:
+                result['invalid'] += 1
+                continue
+            if key in rows:
+                _check_conflict(conflict, model, key)
+                if conflict == 'skip':
+                    result['skipped'] += 1
+                    continue
+                #the row is inserted once, with the values of the last one
+                rows[key].update(values)
+                merged[key] += 1
+            else:
+                rows[key], merged[key] = values, 1
+
+        with transaction.commit_on_success(using=using):
+            masters = set(model._default_manager.db_manager(using).filter(
+                    pk__in=set([k[0] for k in rows])).values_list('pk', flat=True))
+            existing = dict([((m, l), pk) for pk, m, l in manager.filter(
+                    **{'%s__in' % master_field.attname : masters,
+                       'language__in' : set([k[1] for k in rows])}
+                    ).values_list('pk', master_field.attname, 'language')])
+
+            new, updates, changed = [], [], set()
+            for (master, language), values in rows.items():
+                count = merged[(master, language)]
+                if not master in masters or not language in languages:
+                    result['invalid'] += count
+                    continue
+                pk = existing.get((master, language))
+                if pk is not None:
+                    _check_conflict(conflict, model, (master, language))
+                    if conflict == 'skip':
+                        result['skipped'] += count
+                        continue
+
+                translation = translation_model(**values)
+                setattr(translation, master_field.attname, master)
+                translation.language_id = language
+                #updates only validate the imported fields, null values are valid if the column allows them
+                exclude = [translation_model._meta.pk.name, master_field.name, 'language'] + \
+                          [f.name for n, f in fields.items() if (pk is not None and not n in values) or \
+                           (f.null and getattr(translation, n) is None)]
+                try:
+                    translation.clean_fields(exclude=exclude)
+                except ValidationError:
+                    result['invalid'] += count
+                    continue
+
+                if pk is not None:
+                    updates.append((pk, dict([(n, getattr(translation, n)) for n in values])))
+                    result['updated'] += count
+                else:
+                    new.append(translation)
+                    #the following rows updated the created translation
+                    result['updated'] += count - 1
+                changed.add(master)
+            _update_rows(translation_model, fields, updates, using)
+            manager.bulk_create(new)
+            result['created'] += len(new)
+
+        #post_save_translation is not called for bulk operations
+        for master in changed:
+            if model.cache_translations:
+                invalidate_translations(model, master)
+            if getattr(model, 'use_translations_snapshot', False):
+                model.update_translations_snapshot(master)
+    return result
@@ -0,0 +1,180 @@
+"""
+Caching of :class:`translations.models.Translation` objects.
+
+Translations are cached per object and language, under keys holding
+a version number of the translated object. Saving or deleting a
+translation increases the version, so stale entries are never read.
+The cache backend is the one returned by
+:func:`translations.utils.get_translations_cache`.
+"""
+import threading
+from django.core.signals import request_finished
+from django.db import connections, transaction
+from utils import get_translations_cache, get_cache_timeout, _new_version
+
+TRANSLATION_KEY_PREFIX = 'yawd-translations:translation'
+
+#process-wide counters
+_stats = {'hits' : 0, 'misses' : 0, 'invalidations' : 0}
+
+#the objects invalidated in the transaction of the current request
+_pending = threading.local()
+
+def _object_key(model, pk):
+    return '%s:%s:%s' % (TRANSLATION_KEY_PREFIX, model._meta, pk)
+
+def get_translations_version(model, pk):
+    """
+    Return the translations version of the ``model`` object with
+    primary key ``pk``.
+    """
+    cache = get_translations_cache()
+    key = '%s:version' % _object_key(model, pk)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), get_cache_timeout())
+        version = cache.get(key)
+    return version
+
+def _increase_translations_version(model, pk):
+    cache = get_translations_cache()
+    key = '%s:version' % _object_key(model, pk)
+    try:
+        cache.incr(key)
+    except ValueError:
+        #nothing has been cached for this version
+        pass
+
+def invalidate_translations(model, pk):
+    """
+    Invalidate the cached translations of the ``model`` object with
+    primary key ``pk``.
+
+    Other processes can not see the changes before they are committed.
+    If a transaction is open (e.g. in the admin views), the version is
+    increased again when the request finishes, so that translations (and
+    fragments) cached from the old rows in the meantime are discarded.
+    """
+    _increase_translations_version(model, pk)
+    _stats['invalidations'] += 1
+    if any([transaction.is_managed(using=alias) for alias in connections]):
+        if not hasattr(_pending, 'objects'):
+            _pending.objects = set()
+        _pending.objects.add((model, pk))
+
+def _invalidate_pending_translations(**kwargs):
+    """
+    **Signal receiver**. Increase the translations version of the objects
+    invalidated in a transaction once more after the request.
+    """
+    objects = getattr(_pending, 'objects', None)
+    if objects:
+        _pending.objects = set()
+        for model, pk in objects:
+            _increase_translations_version(model, pk)
+
+request_finished.connect(_invalidate_pending_translations, dispatch_uid='translations-pending-translations')
+
+def load_translations(objects, language_id):
+    """
+    Load the translations of the :class:`translations.models.Translatable`
+    ``objects`` (of the same model) in ``language_id``, storing them in the
+    objects. This costs two cache round-trips for all the objects, and a
+    single database query for the translations not found in the cache.
+    """
+    objects = [o for o in objects if o.pk is not None]
+    if not objects:
+        return
+
+    model = type(objects[0])
+    related = model._meta.get_field_by_name('translations')[0]
+    cache = get_translations_cache()
+    pks = set([o.pk for o in objects])
+
+    version_keys = dict([(pk, '%s:version' % _object_key(model, pk)) for pk in pks])
+    versions = cache.get_many(version_keys.values())
+    missing = [k for k in version_keys.values() if versions.get(k) is None]
+    if missing:
+        new_versions = dict([(k, _new_version()) for k in missing])
+        cache.set_many(new_versions, get_cache_timeout())
+        versions.update(new_versions)
+
+    keys = dict([(pk, '%s:%s:%s' % (_object_key(model, pk), versions[version_keys[pk]], language_id)) \
+                 for pk in pks])
+    #entries are wrapped in a tuple to cache missing translations as well
+    cached = cache.get_many(keys.values())
+    translations, misses = {}, []
+    for pk in pks:
+        if cached.get(keys[pk]) is not None:
+            translations[pk] = cached[keys[pk]][0]
+        else:
+            misses.append(pk)
+    _stats['hits'] += len(pks) - len(misses)
+
+    if misses:
+        _stats['misses'] += len(misses)
+        #not using the related manager, the translated object
+        #would be cached along with the translation
+        found = dict([(getattr(t, related.field.attname), t) for t in \
+                      related.model._default_manager.filter(**{'%s__in' % related.field.attname : misses,
+                                                               'language' : language_id})])
+        cache.set_many(dict([(keys[pk], (found.get(pk),)) for pk in misses]), get_cache_timeout())
+        for pk in misses:
+            translations[pk] = found.get(pk)
+
+    for obj in objects:
+        translation = translations[obj.pk]
+        if translation is not None:
+            setattr(translation, related.field.name, obj)
+        obj.__dict__.setdefault('_cached_translations', {})[language_id] = translation
+
+def get_translation(obj, language_id):
+    """
+    Return the translation of the :class:`translations.models.Translatable`
+    ``obj`` in ``language_id`` (or ``None``), loading it from the
+    database on cache misses.
+    """
+    load_translations([obj], language_id)
+    return obj._cached_translations[language_id]
+
+def get_fragment(key, render, model=None, pk=None):
+    """
+    Return the fragment cached under ``key``, calling ``render`` to create
+    it if it is not cached. If a ``model`` and ``pk`` are given, the fragment
+    is tied to the translations version of that object and is rendered
+    again when the object or its translations change. This costs a single
+    cache round-trip on hits.
+    """
+    cache = get_translations_cache()
+    version = None
+
+    if model is not None:
+        version_key = '%s:version' % _object_key(model, pk)
+        values = cache.get_many([key, version_key])
+        version = values.get(version_key)
+        if version is None:
+            version = get_translations_version(model, pk)
+    else:
+        values = { key : cache.get(key) }
+
+    #fragments are stored along with the version they were rendered for
+    cached = values.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    fragment = render()
+    cache.set(key, (version, fragment), get_cache_timeout())
+    return fragment
+
+def get_cache_stats():
+    """
+    Return the hit, miss and invalidation counters of this process.
+    """
+    return dict(_stats)
+
+def reset_cache_stats():
+    """
+    Reset the counters returned by :func:`get_cache_stats`.
+    """
+    for key in _stats:
+        _stats[key] = 0
@@ -0,0 +1,191 @@
+"""
+Memory-mapped message catalogs.
+
+A :class:`MappedTranslation` serves its messages directly from a memory
+mapped ``.mo`` file, using the hash table of the file for lookups, instead
+of parsing the whole catalog in a dictionary. The pages of the file are
+shared among all processes mapping it and only the messages actually used
+are decoded. See the ``TRANSLATIONS_MMAP_CATALOGS`` setting.
+"""
+import mmap, struct, threading
+from collections import OrderedDict
+from django.utils.translation.trans_real import DjangoTranslation
+from gettext import c2py
+from pofile import MO_MAGIC, _hashpjw
+
+class MappedCatalog(object):
+    """
+    A read-only mapping over a memory mapped ``.mo`` file, looked up the way
+    the ``_catalog`` dictionary of ``gettext.GNUTranslations`` is: singular
+    messages by msgid, plural messages by ``(msgid, index)`` tuples. Catalogs
+    merged in with :meth:`update` take precedence over the file messages.
+    The ``memo_size`` most recently looked up messages are kept decoded.
+    """
+    memo_size = 1000
+
+    def __init__(self, fileobj):
+        self.charset = None
+        self._overlay = {}
+        self._memo = OrderedDict()
+        self._memo_lock = threading.Lock()
+        self._map = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic = struct.unpack('<I', self._map[:4])[0]
+        if magic == MO_MAGIC:
+            self._order = '<'
+        elif magic == struct.unpack('>I', struct.pack('<I', MO_MAGIC))[0]:
+            self._order = '>'
+        else:
+            raise IOError(0, 'Bad magic number', getattr(fileobj, 'name', ''))
+
+        revision, self._count, self._originals, self._translations, self._hash_size, \
+            self._hash_offset = struct.unpack(self._order + '6I', self._map[4:28])
+        if self._originals + self._count * 8 > len(self._map) or \
+                self._translations + self._count * 8 > len(self._map):
+            raise IOError(0, 'File is corrupt', getattr(fileobj, 'name', ''))
+
+        header = self._find('', False)
+        self.header = self._string(self._translations, header) if header is not None else ''
+
+    def _string(self, table, index):
+        length, offset = struct.unpack_from(self._order + 'II', self._map, table + index * 8)
+        return self._map[offset:offset + length]
+
+    def _matches(self, index, key, plural):
+        original = self._string(self._originals, index)
+        if plural:
+            return original.split('\0', 1)[0] == key and '\0' in original
+        return original == key
+
+    def _find(self, key, plural):
+        """
+        Return the index of the message ``key`` (a byte string) or ``None``.
+        """
+        size = self._hash_size
+        if size > 2:
+            h = _hashpjw(key)
+            index = h % size
+            incr = 1 + (h % (size - 2))
+            for i in xrange(size):
+                entry = struct.unpack_from(self._order + 'I', self._map, self._hash_offset + index * 4)[0]
+                if not entry:
+                    return None
+                if self._matches(entry - 1, key, plural):
+                    return entry - 1
+                index = index - (size - incr) if index >= size - incr else index + incr
+            return None
+
+        #no hash table, originals are sorted
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._string(self._originals, mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        for index in (lo, lo + 1):
+            if index < self._count and self._matches(index, key, plural):
+                return index
+        return None
+
+    def _lookup(self, key):
+        plural = isinstance(key, tuple)
+        msgid = key[0] if plural else key
+        if isinstance(msgid, unicode):
+            try:
+                msgid = msgid.encode(self.charset or 'ascii')
+            except UnicodeEncodeError:
+                return None
+
+        index = self._find(msgid, plural)
+        if index is None:
+            return None
+        value = self._string(self._translations, index)
+        if plural:
+            forms = value.split('\0')
+            if key[1] >= len(forms):
+                return None
+            value = forms[key[1]]
+        return unicode(value, self.charset) if self.charset else value
+
+    def __getitem__(self, key):
+        if key in self._overlay:
+            return self._overlay[key]
+        with self._memo_lock:
+            #move the message to the end of the least recently used order
+            value = self._memo.pop(key, self._memo)
+            if value is self._memo:
+                value = self._lookup(key)
+                if len(self._memo) >= self.memo_size:
+                    self._memo.popitem(last=False)
+            self._memo[key] = value
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def update(self, other):
+        self._overlay.update(other)
+
+    def items(self):
+        """
+        Return all the messages of the catalog, keyed as in
+        ``gettext.GNUTranslations``.
+        """
+        decode = (lambda s: unicode(s, self.charset)) if self.charset else (lambda s: s)
+        items = {}
+        for index in xrange(self._count):
+            original = self._string(self._originals, index)
+            value = self._string(self._translations, index)
+            if '\0' in original:
+                msgid = decode(original.split('\0', 1)[0])
+                for i, form in enumerate(value.split('\0')):
+                    items[(msgid, i)] = decode(form)
+            else:
+                items[decode(original)] = decode(value)
+        items.update(self._overlay)
+        return items.items()
+
+    def close(self):
+        self._map.close()
+
+class MappedTranslation(DjangoTranslation):
+    """
+    A django translation object reading its messages from a memory mapped
+    ``.mo`` file (see :class:`MappedCatalog`). Messages missing from the file
+    are looked up in the fallback translation.
+    """
+    def _parse(self, fp):
+        self._catalog = catalog = MappedCatalog(fp)
+        self.plural = lambda n: int(n != 1) # germanic plural by default
+
+        #parse the catalog description as gettext.GNUTranslations does
+        lastk = None
+        for item in catalog.header.splitlines():
+            item = item.strip()
+            if not item:
+                continue
+            k = v = None
+            if ':' in item:
+                k, v = item.split(':', 1)
+                k = k.strip().lower()
+                v = v.strip()
+                self._info[k] = v
+                lastk = k
+            elif lastk:
+                self._info[lastk] += '\n' + item
+            if k == 'content-type':
+                self._charset = v.split('charset=')[1]
+            elif k == 'plural-forms':
+                v = v.split(';')
+                plural = v[1].split('plural=')[1]
+                self.plural = c2py(plural)
+        catalog.charset = self._charset
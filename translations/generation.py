@@ -0,0 +1,493 @@
+"""
+Generation of the project-wide message catalogs of a language.
+
+The messages of every installed application are extracted with
+``makemessages``, copied to the ``LOCALE_PATHS`` folder of the language
+and merged in a unified catalog for each domain. A manifest of the source
+files and catalogs used in the last run is kept in ``LOCALE_PATHS[0]``,
+so that only the applications whose sources changed are processed again.
+
+Applications are processed in parallel. ``makemessages`` examines the
+current directory, so it runs in a separate python process started in
+the application folder, instead of changing the working directory of the
+whole (possibly threaded) server.
+"""
+import fnmatch, hashlib, json, multiprocessing, os, shutil, subprocess, sys, time
+from multiprocessing.pool import ThreadPool
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.utils.importlib import import_module
+from django.utils.translation import to_locale
+from pofile import POFileError, compile_file, file_lock, get_index, update_mo, write_entry, write_file
+from utils import concat_message_files, reset_translations
+
+MANIFEST_NAME = '.yawd-translations-manifest.json'
+
+#the phases of the generation, as reported in the timings of generate_messages
+PHASES = ('extract', 'copy', 'compile')
+
+#the makemessages extensions used for each domain
+DOMAINS = (('django', ['html', 'txt']), ('djangojs', []))
+
+#the files makemessages examines for each domain
+SOURCE_EXTENSIONS = {'django' : ('.py', '.html', '.txt'), 'djangojs' : ('.js',)}
+IGNORE_PATTERNS = ('CVS', '.*', '*~')
+
+#run makemessages without the application folder shadowing other modules
+MAKEMESSAGES_SCRIPT = 'import sys; del sys.path[0]; ' \
+        'from django.core.management import execute_from_command_line; ' \
+        'execute_from_command_line([\'django-admin.py\', \'makemessages\'] + sys.argv[1:])'
+
+class Manifest(object):
+    """
+    The record of the source files and catalogs used to generate the
+    messages of each language. A missing or corrupted manifest is treated
+    as empty, which results in a full generation.
+    """
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path, 'rb') as f:
+                self.data = json.load(f)
+            if not isinstance(self.data, dict):
+                raise ValueError
+        except (IOError, ValueError):
+            self.data = {}
+
+    def language(self, locale):
+        return self.data.setdefault(locale, {'apps' : {}, 'catalogs' : {}})
+
+    def clear(self, locale):
+        self.data.pop(locale, None)
+
+    def save(self, locale):
+        """
+        Store the record of ``locale``, keeping the records of the other
+        languages as they are in the file (languages can be generated
+        concurrently, by different processes).
+        """
+        with file_lock(self.path):
+            data = Manifest(self.path).data
+            if locale in self.data:
+                data[locale] = self.data[locale]
+            else:
+                data.pop(locale, None)
+            write_file(self.path, json.dumps(data, sort_keys=True))
+
+def get_manifest_path():
+    return os.path.join(settings.LOCALE_PATHS[0], MANIFEST_NAME)
+
+def _is_ignored(path):
+    return any([fnmatch.fnmatchcase(path, p) for p in IGNORE_PATTERNS])
+
+def _stat(path):
+    st = os.stat(path)
+    return [st.st_mtime, st.st_size]
+
+def scan_sources(root, domain, previous=None):
+    """
+    Return a dictionary mapping the source files of ``domain`` found under
+    ``root`` (as ``makemessages`` would) to ``[mtime, size, sha1]`` lists.
+    Files whose mtime and size did not change since the ``previous`` scan
+    are not hashed again.
+    """
+    previous = previous or {}
+    extensions = SOURCE_EXTENSIONS[domain]
+    sources = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not _is_ignored(d)]
+        for filename in filenames:
+            if _is_ignored(filename) or not os.path.splitext(filename)[1] in extensions:
+                continue
+            path = os.path.join(dirpath, filename)
+            rel_path = os.path.relpath(path, root)
+            signature = _stat(path)
+            old = previous.get(rel_path)
+            if old and old[:2] == signature:
+                signature.append(old[2])
+            else:
+                with open(path, 'rb') as f:
+                    signature.append(hashlib.sha1(f.read()).hexdigest())
+            sources[rel_path] = signature
+    return sources
+
+def _sources_changed(old, new):
+    if old is None or set(old) != set(new):
+        return True
+    return any([old[p][2] != new[p][2] for p in new])
+
+def get_generation_workers():
+    return getattr(settings, 'TRANSLATIONS_GENERATION_WORKERS', None) or multiprocessing.cpu_count()
+
+def run_makemessages(root, domain, extensions, locale):
+    """
+    Run ``makemessages`` for ``domain`` in the ``root`` folder, using the
+    python interpreter of the ``TRANSLATIONS_PYTHON`` setting (by default
+    the current one). Returns ``False`` if there were no messages to
+    process, raises :class:`django.core.management.base.CommandError`
+    if the command failed.
+    """
+    env = dict(os.environ)
+    env['DJANGO_SETTINGS_MODULE'] = os.environ.get('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE)
+    env['PYTHONPATH'] = os.pathsep.join([os.path.abspath(p) for p in sys.path if p])
+
+    args = [getattr(settings, 'TRANSLATIONS_PYTHON', None) or sys.executable,
+            '-c', MAKEMESSAGES_SCRIPT, '--domain=%s' % domain, '--locale=%s' % locale,
+            '--verbosity=0']
+    if extensions:
+        args.append('--extension=%s' % ','.join(extensions))
+
+    process = subprocess.Popen(args, cwd=root, env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = process.communicate()
+    if process.returncode:
+        if stderr.startswith('CommandError:'):
+            #Django throws a CommandError if we process
+            #the domainjs and there are no messages to process.
+            return False
+        raise CommandError('makemessages failed in %s:\n%s' % (root, stderr))
+    return True
+
+def extract_app_messages(app_name, locale, po_path, domains, delete=False):
+    """
+    Run ``makemessages`` for ``domains`` in the non-core application
+    ``app_name`` (see :func:`run_makemessages`), starting from the
+    catalogs found in ``po_path`` (unless ``delete`` is set), and copy the
+    resulting catalogs to ``po_path``. The original files of the
+    application are left untouched. ``makemessages`` runs for one language
+    of an application at a time, in any process. Returns the names of the
+    catalogs copied, or ``None`` if the application has no locale folder.
+    """
+    mod_root = os.path.dirname(import_module(app_name).__file__)
+    if not os.path.exists(os.path.join(mod_root, 'locale')):
+        return None
+
+    original_path = os.path.join(mod_root, 'locale', locale, 'LC_MESSAGES')
+    delete_at_the_end = False
+    if not os.path.exists(original_path):
+        try: #try to create language directory for the app
+            os.makedirs(original_path)
+            delete_at_the_end = True
+        except:
+            return None
+
+    #move original files to a temp file
+    for file_ in list(os.listdir(original_path)):
+        if file_.endswith('.po'):
+            shutil.copy(os.path.join(original_path, file_),
+                        os.path.join(original_path, 'original-%s' % file_))
+
+    if not delete:
+        #replace original file with the yawd version
+        #so that it gets updated
+        for f in list(os.listdir(po_path)):
+            if f.startswith('%s-' % app_name) and f.endswith('.po'):
+                shutil.copy(os.path.join(po_path, f),
+                            os.path.join(original_path, f.replace('%s-' % app_name, '')))
+
+    lang_files = []
+    try:
+        #makemessages writes temporary files next to the application sources,
+        #so the languages processed concurrently take turns on each application
+        with file_lock(os.path.join(mod_root, 'locale')):
+            for domain, extensions in DOMAINS:
+                if domain in domains:
+                    run_makemessages(mod_root, domain, extensions, locale)
+
+        for file_ in list(os.listdir(original_path)):
+            if not file_.startswith('original-') and file_.endswith('.po'):
+                file_name = '%s-%s' % (app_name, file_)
+                copy_path = os.path.join(po_path, file_name)
+                shutil.copy(os.path.join(original_path, file_), copy_path)
+                os.chmod(copy_path, 0664)
+                #unlink updated file
+                os.unlink(os.path.join(original_path, file_))
+                lang_files.append(file_name)
+    finally:
+        if delete_at_the_end:
+            shutil.rmtree(os.path.join(mod_root, 'locale', locale))
+        else:
+            for file_ in os.listdir(original_path):
+                #put back the original application files
+                if file_.startswith('original-') and file_.endswith('.po'):
+                    shutil.move(os.path.join(original_path, file_),
+                                os.path.join(original_path, file_.replace('original-','')))
+    return lang_files
+
+def copy_core_messages(app_name, locale, po_path, delete=False):
+    """
+    Copy the catalogs of the django core application ``app_name`` to
+    ``po_path``, unless they are already there. Returns the names of the
+    catalogs, or ``None`` if the application has no messages for this
+    language.
+    """
+    mod_root = os.path.dirname(import_module(app_name).__file__)
+    original_path = os.path.join(mod_root, 'locale', locale, 'LC_MESSAGES')
+    if not os.path.exists(original_path):
+        return None
+
+    lang_files = []
+    for file_ in list(os.listdir(original_path)):
+        if file_.endswith('.po'):
+            file_name = '%s-%s' % (app_name, file_)
+            copy_path = os.path.join(po_path, file_name)
+            if delete or not os.path.exists(copy_path):
+                shutil.copy(os.path.join(original_path, file_), copy_path)
+                os.chmod(copy_path, 0664)
+            lang_files.append(file_name)
+    return lang_files
+
+def get_changed_domains(app_name, po_path, app_record):
+    """
+    Return a ``(sources, changed)`` tuple holding the source files of each
+    domain of the non-core application ``app_name`` (see
+    :func:`scan_sources`) and the domains whose sources or catalog changed
+    since the run recorded in ``app_record``, or ``None`` if the
+    application has no locale folder.
+    """
+    mod_root = os.path.dirname(import_module(app_name).__file__)
+    if not os.path.exists(os.path.join(mod_root, 'locale')):
+        return None
+
+    app_record = app_record or {}
+    sources, changed = {}, []
+    for domain, extensions in DOMAINS:
+        previous = app_record.get(domain, {})
+        sources[domain] = scan_sources(mod_root, domain, previous.get('sources'))
+        file_name = '%s-%s.po' % (app_name, domain)
+        if _sources_changed(previous.get('sources'), sources[domain]) or \
+                previous.get('catalog') != os.path.exists(os.path.join(po_path, file_name)):
+            changed.append(domain)
+    return sources, changed
+
+def update_app_messages(app_name, locale, po_path, app_record, delete=False):
+    """
+    Extract the messages of the non-core application ``app_name`` for the
+    domains whose sources changed since the run recorded in ``app_record``
+    (see :class:`Manifest`). Returns a ``(lang_files, app_record)`` tuple
+    holding the catalogs of the application in ``po_path`` and the updated
+    record, or ``None`` if the application has no locale folder.
+    """
+    result = get_changed_domains(app_name, po_path, app_record)
+    if result is None:
+        return None
+
+    app_record = dict(app_record or {})
+    sources, changed = result
+    if not changed:
+        return [f for f in ['%s-%s.po' % (app_name, d) for d, e in DOMAINS] \
+                if os.path.exists(os.path.join(po_path, f))], app_record
+
+    lang_files = extract_app_messages(app_name, locale, po_path, changed, delete)
+    if lang_files is None:
+        return None
+    for domain in changed:
+        app_record[domain] = {'sources' : sources[domain],
+                              'catalog' : '%s-%s.po' % (app_name, domain) in lang_files}
+    return lang_files, app_record
+
+def _get_unified_paths(po_path, domain):
+    po_file = os.path.join(po_path, '%s.po' % domain)
+    return po_file, '%s.mo' % os.path.splitext(po_file)[0]
+
+def _get_source_files(po_path, domain):
+    source_files = [os.path.join(po_path, '%s-%s.po' % (app_name, domain)) \
+                    for app_name in settings.INSTALLED_APPS]
+    return [f for f in source_files if os.path.exists(f)]
+
+def update_unified_catalog(language, po_path, domain):
+    """
+    Merge the application catalogs of ``domain`` found in ``po_path`` in
+    the unified ``.po`` and ``.mo`` files (e.g. after a catalog was edited)
+    and reload the messages of the ``language`` name.
+
+    Raises :class:`translations.pofile.POFileError` if the catalogs
+    can not be compiled.
+    """
+    source_files = _get_source_files(po_path, domain)
+    if source_files:
+        po_file, mo_file = _get_unified_paths(po_path, domain)
+        with file_lock(mo_file):
+            concat_message_files(source_files, po_file, compile=True)
+
+    #reset the cached translation messages so that
+    #we do not need to restart the web server
+    reset_translations(language)
+
+def update_unified_entry(language, po_path, domain, app_catalog, entry):
+    """
+    Copy the ``entry`` just written to the ``app_catalog`` file of
+    ``po_path`` to the unified ``.po`` and ``.mo`` files of ``domain``,
+    instead of merging and compiling all the application catalogs again.
+    Nothing changes if the message is defined by a previous catalog. Falls
+    back to :func:`update_unified_catalog` if the unified catalog does not
+    have the message.
+
+    Raises :class:`translations.pofile.POFileError` if the catalog
+    can not be compiled.
+    """
+    source_files = _get_source_files(po_path, domain)
+    app_catalog = os.path.join(po_path, app_catalog)
+    po_file, mo_file = _get_unified_paths(po_path, domain)
+    if entry.is_header or not app_catalog in source_files:
+        return update_unified_catalog(language, po_path, domain)
+
+    with file_lock(mo_file):
+        for source_file in source_files[:source_files.index(app_catalog)]:
+            if entry.key in get_index(source_file).offsets:
+                #the unified catalog uses the first definition of the message
+                return
+        try:
+            write_entry(po_file, entry)
+        except (IOError, OSError, KeyError):
+            concat_message_files(source_files, po_file, compile=True)
+        else:
+            try:
+                update_mo(mo_file, entry, get_index(po_file).charset)
+            except (IOError, POFileError):
+                compile_file(po_file, mo_file)
+    reset_translations(language)
+
+def generate_messages(language, po_path, delete=False, progress=None, workers=None, timings=None):
+    """
+    Generate the catalogs of the ``language`` name in ``po_path`` and
+    merge them in a unified ``.po`` and ``.mo`` file for each domain.
+    Applications are processed in parallel by a pool of ``workers``
+    threads (by default the ``TRANSLATIONS_GENERATION_WORKERS`` setting or
+    the number of CPUs), each waiting on its own ``makemessages`` process.
+    Applications whose sources did not change since the last run are not
+    processed again and unified catalogs are only rebuilt if one of their
+    inputs changed. If ``delete`` is set, the existing catalogs are removed
+    and the messages are generated from scratch. ``progress`` is called
+    with the number of processed and total applications as each
+    application is processed. If a ``timings`` dictionary is given, the
+    duration in seconds of each of the :data:`PHASES` is stored in it.
+
+    Returns a ``(lang_files, errors)`` tuple, ``errors`` being the list of
+    :class:`translations.pofile.POFileError` raised when compiling.
+    """
+    locale = to_locale(language)
+    manifest = Manifest(get_manifest_path())
+    if delete:
+        manifest.clear(locale)
+        for f in os.listdir(po_path):
+            if f.endswith('.po') or f.endswith('.mo'):
+                os.unlink(os.path.join(po_path, f))
+    record = manifest.language(locale)
+
+    def process(app_name):
+        return app_name, update_app_messages(app_name, locale, po_path,
+                                             record['apps'].get(app_name), delete)
+
+    timings = timings if timings is not None else {}
+    started = time.time()
+    apps = [a for a in settings.INSTALLED_APPS if not a.startswith('django.contrib')]
+    pool = ThreadPool(max(1, min(workers or get_generation_workers(), len(apps))))
+    results = {}
+    try:
+        for app_name, result in pool.imap_unordered(process, apps):
+            results[app_name] = result
+            if progress:
+                progress(len(results), len(apps))
+    finally:
+        pool.close()
+        pool.join()
+    timings['extract'] = time.time() - started
+
+    #collect the catalogs in the order of the installed applications
+    started = time.time()
+    lang_files = []
+    for app_name in settings.INSTALLED_APPS:
+        if app_name.startswith('django.contrib'):
+            lang_files.extend(copy_core_messages(app_name, locale, po_path, delete) or [])
+        elif results[app_name] is None:
+            record['apps'].pop(app_name, None)
+        else:
+            lang_files.extend(results[app_name][0])
+            record['apps'][app_name] = results[app_name][1]
+
+    timings['copy'] = time.time() - started
+
+    #concat all messages in a single .po file for each domain
+    started = time.time()
+    errors, rebuilt = [], False
+    for domain, extensions in DOMAINS:
+        file_name = '%s.po' % domain
+        uni_django_path = os.path.join(po_path, file_name)
+
+        source_files = [os.path.join(po_path, f) for f in lang_files if f.endswith(file_name)]
+        if source_files:
+            inputs = [[f] + _stat(f) for f in source_files]
+            if inputs == record['catalogs'].get(domain) and os.path.exists(uni_django_path) \
+                    and os.path.exists('%s.mo' % os.path.splitext(uni_django_path)[0]):
+                continue
+            #merge .po files and compile django.po
+            try:
+                with file_lock(_get_unified_paths(po_path, domain)[1]):
+                    concat_message_files(source_files, uni_django_path, compile=True)
+                record['catalogs'][domain] = inputs
+            except POFileError, e:
+                record['catalogs'].pop(domain, None)
+                errors.append(e)
+            rebuilt = True
+        elif os.path.exists(uni_django_path):
+            os.unlink(uni_django_path)
+            record['catalogs'].pop(domain, None)
+            rebuilt = True
+
+    manifest.save(locale)
+
+    if rebuilt:
+        #reset the cached translation messages so that
+        #we do not need to restart the web server
+        reset_translations(language)
+    timings['compile'] = time.time() - started
+    return lang_files, errors
+
+def plan_messages(language, po_path, delete=False):
+    """
+    Return what :func:`generate_messages` would do for the ``language``
+    name, without changing any file: a dictionary holding the applications
+    whose messages would be ``extract``-ed, the core applications whose
+    catalogs would be ``copy``-ied and the domains whose unified catalogs
+    would be rebuilt (``compile``).
+    """
+    locale = to_locale(language)
+    record = {'apps' : {}, 'catalogs' : {}} if delete else \
+            Manifest(get_manifest_path()).data.get(locale, {'apps' : {}, 'catalogs' : {}})
+    exists = lambda f: not delete and os.path.exists(os.path.join(po_path, f))
+
+    plan = {'extract' : [], 'copy' : [], 'compile' : []}
+    lang_files, changed_domains = [], set()
+    for app_name in settings.INSTALLED_APPS:
+        if app_name.startswith('django.contrib'):
+            original_path = os.path.join(os.path.dirname(import_module(app_name).__file__),
+                                         'locale', locale, 'LC_MESSAGES')
+            if os.path.exists(original_path):
+                files = ['%s-%s' % (app_name, f) for f in os.listdir(original_path) if f.endswith('.po')]
+                if [f for f in files if not exists(f)]:
+                    plan['copy'].append(app_name)
+                    changed_domains.update([f[len(app_name) + 1:-3] for f in files if not exists(f)])
+                lang_files.extend(files)
+            continue
+
+        result = get_changed_domains(app_name, po_path, None if delete else record['apps'].get(app_name))
+        if result is not None:
+            if result[1]:
+                plan['extract'].append(app_name)
+                changed_domains.update(result[1])
+            lang_files.extend(['%s-%s.po' % (app_name, d) for d, e in DOMAINS])
+
+    for domain, extensions in DOMAINS:
+        file_name = '%s.po' % domain
+        source_files = [os.path.join(po_path, f) for f in lang_files if f.endswith(file_name) and exists(f)]
+        if domain in changed_domains:
+            plan['compile'].append(domain)
+        elif source_files:
+            if [[f] + _stat(f) for f in source_files] != record['catalogs'].get(domain) or \
+                    not exists(file_name) or not exists('%s.mo' % domain):
+                plan['compile'].append(domain)
+        elif exists(file_name):
+            #the unified catalog would be removed
+            plan['compile'].append(domain)
+    return plan
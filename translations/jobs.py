@@ -0,0 +1,240 @@
+"""
+Background generation of the translation messages.
+
+Generation jobs run in a pool of threads of the submitting process, without
+the need of an external broker. The state of the job of each language is
+stored in a file of its ``LOCALE_PATHS`` folder, so that any process can
+report its progress, and a lock file ensures that only one job per language
+runs at a time.
+"""
+import errno, json, os, time, traceback, uuid
+from multiprocessing.pool import ThreadPool
+from threading import Event, Lock, Thread
+from django.conf import settings
+from django.db import close_connection
+from django.utils.translation import to_locale
+from generation import generate_messages
+from pofile import write_file
+
+JOB_STATE_NAME = '.yawd-translations-job.json'
+JOB_LOCK_NAME = '.yawd-translations-job.lock'
+
+class JobConflictError(Exception):
+    """
+    Raised when a job is submitted while a job of the same language with a
+    different ``delete`` flag is pending or running.
+    """
+    pass
+
+_pool = None
+_pool_lock = Lock()
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPool(getattr(settings, 'TRANSLATIONS_JOB_WORKERS', 1))
+    return _pool
+
+def get_job_timeout():
+    return getattr(settings, 'TRANSLATIONS_JOB_TIMEOUT', 600)
+
+def get_po_path(language):
+    return os.path.join(settings.LOCALE_PATHS[0], to_locale(language), 'LC_MESSAGES')
+
+def _get_paths(language):
+    path = os.path.join(settings.LOCALE_PATHS[0], to_locale(language))
+    return os.path.join(path, JOB_STATE_NAME), os.path.join(path, JOB_LOCK_NAME)
+
+def _is_stale(lock_path):
+    """
+    True if no job holds the lock, or the lock was not refreshed by the
+    heartbeat of its job for ``TRANSLATIONS_JOB_TIMEOUT`` seconds (e.g.
+    because its process was killed).
+    """
+    try:
+        return time.time() - os.stat(lock_path).st_mtime > get_job_timeout()
+    except OSError:
+        return True
+
+def _create_lock(lock_path, token):
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0664)
+    except OSError:
+        return False
+    try:
+        os.write(fd, token)
+    finally:
+        os.close(fd)
+    return True
+
+def _owns(lock_path, token):
+    try:
+        with open(lock_path, 'rb') as f:
+            return f.read() == token
+    except IOError:
+        return False
+
+def _acquire(lock_path, token):
+    """
+    Acquire the ``lock_path`` lock for the job identified by ``token``
+    (written in the lock file). Stale locks are taken over.
+    """
+    if _create_lock(lock_path, token):
+        return True
+    if not os.path.exists(lock_path) or not _is_stale(lock_path):
+        return False
+
+    #take the stale lock over by renaming it, only one process can do so
+    stale_path = '%s.%s' % (lock_path, uuid.uuid4().hex)
+    try:
+        os.rename(lock_path, stale_path)
+    except OSError:
+        return False
+    if not _is_stale(stale_path):
+        #another process took the lock over in the meantime, put its lock back
+        try:
+            os.link(stale_path, lock_path)
+        except OSError:
+            pass
+        os.unlink(stale_path)
+        return False
+    os.unlink(stale_path)
+    return _create_lock(lock_path, token)
+
+def _release(lock_path, token):
+    """
+    Remove the ``lock_path`` lock, unless another job took it over.
+    """
+    if _owns(lock_path, token):
+        os.unlink(lock_path)
+
+class _Heartbeat(Thread):
+    """
+    Touch the lock of a job periodically while the job is pending or
+    running, so that it does not look stale however long it waits in the
+    pool or stays in a single phase.
+    """
+    def __init__(self, lock_path, token):
+        super(_Heartbeat, self).__init__()
+        self.daemon = True
+        self.lock_path, self.token = lock_path, token
+        self._stopped = Event()
+
+    def run(self):
+        while not self._stopped.wait(max(1, get_job_timeout() / 4.0)):
+            if not _owns(self.lock_path, self.token):
+                break
+            try:
+                os.utime(self.lock_path, None)
+            except OSError:
+                break
+
+    def stop(self):
+        self._stopped.set()
+
+def _save(job):
+    state_path, lock_path = _get_paths(job['language'])
+    write_file(state_path, json.dumps(job))
+
+def get_job(language):
+    """
+    Return the state of the last generation job of ``language``
+    (a dictionary), or ``None`` if no job was ever submitted.
+    """
+    state_path, lock_path = _get_paths(language)
+    try:
+        with open(state_path, 'rb') as f:
+            job = json.load(f)
+    except (IOError, ValueError):
+        return None
+
+    if job.get('status') in ('pending', 'running') and _is_stale(lock_path):
+        job['status'] = 'failed'
+        job['errors'] = ['The job was interrupted.']
+    return job
+
+def _new_job(language, delete):
+    return {'id' : uuid.uuid4().hex, 'language' : language, 'delete' : delete,
+            'status' : 'pending', 'submitted' : time.time(), 'started' : None,
+            'finished' : None, 'apps_done' : 0, 'apps_total' : 0,
+            'lang_files' : [], 'errors' : [], 'timings' : {}}
+
+def submit_job(language, delete=False):
+    """
+    Submit a job generating the messages of ``language`` (see
+    :func:`translations.generation.generate_messages`) and return its
+    state. If a job for this language is already pending or running in
+    any process, no new job is submitted and the state of that job is
+    returned instead; :class:`translations.jobs.JobConflictError` is
+    raised if that job does not have the same ``delete`` flag.
+    """
+    po_path = get_po_path(language)
+    if not os.path.exists(po_path):
+        os.makedirs(po_path)
+
+    state_path, lock_path = _get_paths(language)
+    job = _new_job(language, delete)
+    if not _acquire(lock_path, job['id']):
+        #the running job might not have stored its state yet
+        job = get_job(language) or {'language' : language, 'status' : 'pending'}
+        if job['status'] in ('pending', 'running') and job.get('delete', delete) != delete:
+            raise JobConflictError(job)
+        return job
+
+    heartbeat = _Heartbeat(lock_path, job['id'])
+    heartbeat.start()
+    try:
+        _save(job)
+        _get_pool().apply_async(_run_job, (job, heartbeat))
+    except:
+        heartbeat.stop()
+        _release(lock_path, job['id'])
+        raise
+    return job
+
+def run_job(language, delete=False, workers=None):
+    """
+    Run a job generating the messages of ``language`` in the current
+    thread, using ``workers`` threads for the applications (see
+    :func:`translations.generation.generate_messages`), and return its
+    final state. Returns ``None`` if a job for this language is already
+    pending or running in any process.
+    """
+    po_path = get_po_path(language)
+    if not os.path.exists(po_path):
+        os.makedirs(po_path)
+
+    lock_path = _get_paths(language)[1]
+    job = _new_job(language, delete)
+    if not _acquire(lock_path, job['id']):
+        return None
+    heartbeat = _Heartbeat(lock_path, job['id'])
+    heartbeat.start()
+    _run_job(job, heartbeat, workers)
+    return job
+
+def _run_job(job, heartbeat, workers=None):
+    def progress(done, total):
+        job['apps_done'], job['apps_total'] = done, total
+        _save(job)
+
+    job['status'], job['started'] = 'running', time.time()
+    try:
+        _save(job)
+        lang_files, errors = generate_messages(job['language'], get_po_path(job['language']),
+                                               job['delete'], progress, workers, job['timings'])
+        job['lang_files'] = sorted(lang_files)
+        job['errors'] = [unicode(e) for e in errors]
+        job['status'] = 'done'
+    except Exception:
+        job['errors'] = [traceback.format_exc()]
+        job['status'] = 'failed'
+    finally:
+        job['finished'] = time.time()
+        try:
+            _save(job)
+        finally:
+            heartbeat.stop()
+            _release(_get_paths(job['language'])[1], job['id'])
+            close_connection()
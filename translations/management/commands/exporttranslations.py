@@ -0,0 +1,53 @@
+import sys
+from optparse import make_option
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import get_model
+from translations.bulk import FORMATS, export_translations
+from translations.models import Translatable
+
+def get_translatable_model(label):
+    """
+    Return the :class:`translations.models.Translatable` model of an
+    ``appname.ModelName`` label.
+    """
+    try:
+        app_label, model_name = label.split('.')
+    except ValueError:
+        raise CommandError('Models should be given as appname.ModelName, not "%s"' % label)
+    model = get_model(app_label, model_name)
+    if model is None or not issubclass(model, Translatable):
+        raise CommandError('"%s" is not a Translatable model' % label)
+    return model
+
+class Command(BaseCommand):
+    """
+    Export the translations of a :class:`translations.models.Translatable`
+    model as JSON lines or CSV (see :func:`translations.bulk.export_translations`).
+    """
+    option_list = BaseCommand.option_list + (
+        make_option('--format', type='choice', choices=FORMATS, dest='format', default='jsonl',
+            help='The output format (jsonl or csv).'),
+        make_option('--output', '-o', dest='output', default=None,
+            help='The output file (the standard output by default).'),
+        make_option('--language', '-l', action='append', dest='languages', default=[],
+            help='Only export the translations of this language (can be used multiple times).'),
+        make_option('--chunk-size', type='int', dest='chunk_size', default=1000,
+            help='The number of translations to read in each query.'),
+    )
+    args = '<appname.ModelName>'
+    help = 'Exports the translations of a Translatable model.'
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError('Please give one appname.ModelName model')
+        model = get_translatable_model(args[0])
+
+        fileobj = open(options['output'], 'wb') if options['output'] else sys.stdout
+        try:
+            count = export_translations(model, fileobj, options['format'],
+                                        options['languages'], options['chunk_size'])
+        finally:
+            if options['output']:
+                fileobj.close()
+        if options['output']:
+            self.stdout.write('%s: %d translations exported' % (model._meta, count))
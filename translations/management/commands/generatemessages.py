@@ -0,0 +1,78 @@
+import multiprocessing, time
+from multiprocessing.pool import ThreadPool
+from optparse import make_option
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from translations.generation import PHASES, get_generation_workers, plan_messages
+from translations.jobs import get_po_path, run_job
+from translations.models import Language
+
+class Command(BaseCommand):
+    """
+    Generate and compile the translation messages of all (or the given)
+    languages, as the `'Generate messages'` admin button does. Languages
+    are processed concurrently (see :func:`translations.jobs.run_job`).
+    """
+    option_list = BaseCommand.option_list + (
+        make_option('--delete', action='store_true', dest='delete', default=False,
+            help='Remove the existing catalogs and generate the messages from scratch.'),
+        make_option('--dry-run', action='store_true', dest='dry_run', default=False,
+            help='Report the applications and catalogs that would be processed without changing any file.'),
+        make_option('--parallel', type='int', dest='parallel', default=None,
+            help='The number of languages to process concurrently (by default the number of CPUs).'),
+        make_option('--workers', type='int', dest='workers', default=None,
+            help='The number of applications of each language to process concurrently.'),
+    )
+    args = '[language ...]'
+    help = 'Generates and compiles the translation messages of all languages (or the given ones).'
+
+    def handle(self, *args, **options):
+        if not settings.LOCALE_PATHS:
+            raise CommandError('Please set the LOCALE_PATHS project setting to allow the '
+                               'creation of a unified messages catalog.')
+
+        languages = list(Language.objects.values_list('name', flat=True))
+        if args:
+            missing = [l for l in args if not l in languages]
+            if missing:
+                raise CommandError('Unknown languages: %s' % ', '.join(missing))
+            languages = list(args)
+
+        if options['dry_run']:
+            for language in languages:
+                plan = plan_messages(language, get_po_path(language), options['delete'])
+                if not any(plan.values()):
+                    self.stdout.write('%s: nothing to do' % language)
+                for phase in PHASES:
+                    if plan[phase]:
+                        self.stdout.write('%s: %s %s' % (language, phase, ', '.join(plan[phase])))
+            return
+
+        parallel = max(1, min(options['parallel'] or multiprocessing.cpu_count(), len(languages)))
+        workers = options['workers'] or max(1, get_generation_workers() // parallel)
+
+        started, failed = time.time(), []
+        pool = ThreadPool(parallel)
+        try:
+            for language, job in pool.imap_unordered(
+                    lambda l: (l, run_job(l, options['delete'], workers)), languages):
+                if job is None:
+                    failed.append(language)
+                    self.stderr.write('%s: a generation job is already running' % language)
+                    continue
+
+                timings = job.get('timings', {})
+                self.stdout.write('%s: %d catalogs, %s, total %.2fs' % (language, len(job['lang_files']),
+                                  ', '.join(['%s %.2fs' % (p, timings[p]) for p in PHASES if p in timings]),
+                                  job['finished'] - job['started']))
+                if job['errors']:
+                    failed.append(language)
+                    for error in job['errors']:
+                        self.stderr.write('%s: %s' % (language, error))
+        finally:
+            pool.close()
+            pool.join()
+
+        self.stdout.write('%d languages in %.2fs' % (len(languages), time.time() - started))
+        if failed:
+            raise CommandError('The messages of %s could not be generated' % ', '.join(sorted(failed)))
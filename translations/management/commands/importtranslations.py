@@ -0,0 +1,38 @@
+from optparse import make_option
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+from translations.bulk import CONFLICTS, FORMATS, ConflictError, import_translations
+from translations.management.commands.exporttranslations import get_translatable_model
+
+class Command(BaseCommand):
+    """
+    Import the translations of a :class:`translations.models.Translatable`
+    model from a JSON lines or CSV file (see
+    :func:`translations.bulk.import_translations`).
+    """
+    option_list = BaseCommand.option_list + (
+        make_option('--format', type='choice', choices=FORMATS, dest='format', default=None,
+            help='The input format (jsonl or csv). By default it is guessed from the file extension.'),
+        make_option('--conflict', type='choice', choices=CONFLICTS, dest='conflict', default='update',
+            help='What to do with translations that already exist: update (default), skip or error.'),
+        make_option('--batch-size', type='int', dest='batch_size', default=1000,
+            help='The number of translations to import in each transaction.'),
+    )
+    args = '<appname.ModelName> <file>'
+    help = 'Imports the translations of a Translatable model.'
+
+    def handle(self, *args, **options):
+        if len(args) != 2:
+            raise CommandError('Please give an appname.ModelName model and the file to import')
+        model = get_translatable_model(args[0])
+        format = options['format'] or ('csv' if args[1].lower().endswith('.csv') else 'jsonl')
+
+        try:
+            with open(args[1], 'rb') as f:
+                result = import_translations(model, f, format, options['conflict'], options['batch_size'])
+        except (IOError, ValueError, ValidationError, ConflictError, DatabaseError), e:
+            raise CommandError('Import failed: %s' % e)
+
+        self.stdout.write('%s: %d translations created, %d updated, %d skipped, %d invalid' % \
+                          (model._meta, result['created'], result['updated'], result['skipped'], result['invalid']))
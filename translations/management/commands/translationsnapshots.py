@@ -0,0 +1,70 @@
+from optparse import make_option
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import get_model, get_models
+from translations.models import SnapshotTranslatable
+
+class Command(BaseCommand):
+    """
+    Fill in or verify the translation snapshots of
+    :class:`translations.models.SnapshotTranslatable` models.
+    """
+    option_list = BaseCommand.option_list + (
+        make_option('--verify', action='store_true', dest='verify', default=False,
+            help='Report objects with outdated snapshots instead of updating them.'),
+        make_option('--chunk-size', type='int', dest='chunk_size', default=1000,
+            help='The number of objects to process in each query.'),
+    )
+    args = '[appname.ModelName ...]'
+    help = 'Builds the translation snapshots of SnapshotTranslatable models (all models if none is given).'
+
+    def handle(self, *args, **options):
+        if args:
+            models = []
+            for label in args:
+                try:
+                    app_label, model_name = label.split('.')
+                except ValueError:
+                    raise CommandError('Models should be given as appname.ModelName, not "%s"' % label)
+                model = get_model(app_label, model_name)
+                if model is None or not issubclass(model, SnapshotTranslatable):
+                    raise CommandError('"%s" is not a SnapshotTranslatable model' % label)
+                models.append(model)
+        else:
+            models = [m for m in get_models() if issubclass(m, SnapshotTranslatable)]
+
+        outdated = 0
+        for model in models:
+            count, model_outdated = self.process(model, options['chunk_size'], options['verify'])
+            outdated += model_outdated
+            if options['verify']:
+                self.stdout.write('%s: %d objects, %d outdated snapshots' % (model._meta, count, model_outdated))
+            else:
+                self.stdout.write('%s: %d objects, %d snapshots updated' % (model._meta, count, model_outdated))
+
+        if options['verify'] and outdated:
+            raise CommandError('%d outdated snapshots found' % outdated)
+
+    def process(self, model, chunk_size, verify):
+        """
+        Compare the stored snapshots with the database translations,
+        updating them unless ``verify`` is set.
+        """
+        queryset = model._default_manager.order_by('pk').values_list('pk', 'translations_snapshot')
+        count, outdated, last = 0, 0, None
+
+        while True:
+            chunk = list((queryset.filter(pk__gt=last) if last is not None else queryset)[:chunk_size])
+            for pk, stored in chunk:
+                snapshot = model.get_translations_snapshot(pk)
+                if snapshot != stored:
+                    outdated += 1
+                    if verify:
+                        self.stdout.write('  outdated snapshot: %s #%s' % (model._meta, pk))
+                    else:
+                        model._default_manager.filter(pk=pk).update(translations_snapshot=snapshot)
+            count += len(chunk)
+            if len(chunk) < chunk_size:
+                break
+            last = chunk[-1][0]
+
+        return count, outdated
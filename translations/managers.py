@@ -1,4 +1,188 @@
-from django.db import models
+from collections import namedtuple
+from operator import attrgetter
+from django.db import models, router
+from django.db.models.query import ITER_CHUNK_SIZE, QuerySet, prefetch_one_level, prefetch_related_objects
+from django.utils.translation import get_language
+from utils import get_default_language
+
+class LanguagePrefetcher(object):
+    """
+    A prefetcher for the ``translations`` of a
+    :class:`translations.models.Translatable` model that only fetches
+    the translations of the given languages. This mirrors the related
+    manager's ``get_prefetch_query_set()``, which evaluates its
+    queryset before it can be filtered.
+    """
+    def __init__(self, model, languages):
+        related = model._meta.get_field_by_name('translations')[0]
+        self.model = related.model
+        self.field = related.field
+        self.languages = languages
+
+    def get_prefetch_query_set(self, instances):
+        rel_field = self.field
+        rel_obj_attr = attrgetter(rel_field.attname)
+        instance_attr = attrgetter(rel_field.rel.get_related_field().attname)
+        instances_dict = dict((instance_attr(inst), inst) for inst in instances)
+        db = router.db_for_read(self.model, instance=instances[0])
+        qs = self.model._default_manager.using(db).filter(**{
+            '%s__in' % rel_field.attname : list(instances_dict),
+            'language__in' : self.languages,
+        })
+        #set the reverse relation, as the related manager does
+        for rel_obj in qs:
+            setattr(rel_obj, rel_field.name, instances_dict[rel_obj_attr(rel_obj)])
+        return qs, rel_obj_attr, instance_attr, False, rel_field.related_query_name()
+
+class TranslatableQuerySet(QuerySet):
+    """
+    A ``QuerySet`` that can prefetch the related translations of
+    specific languages only.
+    """
+    def __init__(self, *args, **kwargs):
+        super(TranslatableQuerySet, self).__init__(*args, **kwargs)
+        #None means all languages are prefetched
+        self._translation_languages = None
+
+    def _clone(self, klass=None, setup=False, **kwargs):
+        c = super(TranslatableQuerySet, self)._clone(klass, setup, **kwargs)
+        c._translation_languages = self._translation_languages
+        return c
+
+    def prefetch_translations(self, *languages):
+        """
+        Prefetch only the translations of the given language codes. If no
+        language is given, the active language and the default language
+        (used as fallback by :func:`translations.models.Translatable.get_name`)
+        are prefetched, as they are when the queryset is evaluated.
+
+        Only use this for read-only listings, ``translations.all()`` will
+        not hold the translations of the other languages.
+        """
+        clone = self._clone()
+        clone._translation_languages = languages
+        if not 'translations' in clone._prefetch_related_lookups:
+            clone._prefetch_related_lookups.append('translations')
+        return clone
+
+    def translated_values(self, language, fields, chunk_size=1000):
+        """
+        Iterate over lightweight rows of the translations in ``language``
+        without building model instances. Each row is a named tuple holding
+        the primary key of the translated object (``pk``) and the values of
+        ``fields``. Fields are looked up on the
+        :class:`translations.models.Translation` model, so fields of the
+        translated object can be given using the foreign key name
+        (e.g. ``'product__sku'``); these are fetched in the same query.
+
+        Field names holding ``'__'`` are renamed using a single underscore
+        (``product_sku``) in the returned rows.
+
+        Only the translations of the objects of this queryset are returned.
+        Rows are fetched in chunks of ``chunk_size``, so memory usage does
+        not depend on the size of the table. If the queryset is sliced or
+        explicitly ordered (``order_by()``), rows follow the order of the
+        queryset; otherwise they are ordered by the translation primary key.
+        Objects not translated in ``language`` are skipped.
+        """
+        related = self.model._meta.get_field_by_name('translations')[0]
+        fk = related.field.attname
+        Row = namedtuple('%sRow' % related.model.__name__, ['pk'] + [f.replace('__', '_') for f in fields])
+        translations = related.model._default_manager.using(self.db).filter(language=language)
+
+        if self.query.low_mark or self.query.high_mark is not None or self.query.order_by:
+            return self._ordered_translated_values(translations, fk, fields, Row, chunk_size)
+
+        #restrict to the objects of this queryset
+        queryset = translations.filter(**{'%s__in' % fk : self.order_by().values('pk')}) \
+                .order_by('pk').values_list('pk', fk, *fields)
+        return self._chunked_translated_values(queryset, Row, chunk_size)
+
+    def _chunked_translated_values(self, queryset, Row, chunk_size):
+        last = None
+        while True:
+            chunk = queryset.filter(pk__gt=last) if last is not None else queryset
+            rows = list(chunk[:chunk_size])
+            for row in rows:
+                yield Row._make(row[1:])
+            if len(rows) < chunk_size:
+                break
+            last = rows[-1][0]
+
+    def _ordered_translated_values(self, translations, fk, fields, Row, chunk_size):
+        """
+        Fetch the primary keys of the queryset in chunks (keeping its
+        ordering and limits) and the translations of each chunk.
+        """
+        pks = self.values_list('pk', flat=True)
+        offset = 0
+        while True:
+            chunk = list(pks[offset:offset + chunk_size])
+            if not chunk:
+                break
+            rows = dict([(row[0], row) for row in translations.filter(**{'%s__in' % fk : chunk}) \
+                         .values_list(fk, *fields)])
+            for pk in chunk:
+                if pk in rows:
+                    yield Row._make(rows[pk])
+            if len(chunk) < chunk_size:
+                break
+            offset += chunk_size
+
+    def __len__(self):
+        self._link_objects = True
+        try:
+            return super(TranslatableQuerySet, self).__len__()
+        finally:
+            self._link_objects = False
+
+    def __iter__(self):
+        self._link_objects = True
+        try:
+            return super(TranslatableQuerySet, self).__iter__()
+        finally:
+            self._link_objects = False
+
+    def iterator(self):
+        #objects are not linked when iterator() is called explicitly
+        if not getattr(self.model, 'cache_translations', False) or \
+                not getattr(self, '_link_objects', False):
+            return super(TranslatableQuerySet, self).iterator()
+        return self._batch_iterator()
+
+    def _batch_iterator(self):
+        """
+        Link the objects of the queryset in batches of ``ITER_CHUNK_SIZE``
+        (the objects fetched from the database at a time when iterating),
+        so that the cached translations of a batch are loaded at once (see
+        :func:`translations.cache.load_translations`).
+        """
+        batch = []
+        for obj in super(TranslatableQuerySet, self).iterator():
+            if len(batch) == ITER_CHUNK_SIZE:
+                batch = []
+            batch.append(obj)
+            obj._translations_batch = batch
+            yield obj
+
+    def _prefetch_related_objects(self):
+        if self._translation_languages is None or \
+                not 'translations' in self._prefetch_related_lookups:
+            return super(TranslatableQuerySet, self)._prefetch_related_objects()
+
+        if self._result_cache:
+            languages = self._translation_languages or \
+                    (get_language(), get_default_language())
+            for obj in self._result_cache:
+                if not hasattr(obj, '_prefetched_objects_cache'):
+                    obj._prefetched_objects_cache = {}
+            prefetch_one_level(self._result_cache,
+                               LanguagePrefetcher(self.model, set(languages)),
+                               'translations')
+
+        prefetch_related_objects(self._result_cache, [l for l in \
+                self._prefetch_related_lookups if l != 'translations'])
+        self._prefetch_done = True
 
 class TranslatableManager(models.Manager):
     """
@@ -9,6 +193,17 @@ class TranslatableManager(models.Manager):
     use_for_related_fields = True
     
     def get_query_set(self):
-        return super(TranslatableManager, self).get_query_set().prefetch_related('translations')
+        queryset = TranslatableQuerySet(self.model, using=self._db)
+        #snapshot models read their translations from the snapshot column,
+        #cached models from the django cache
+        if getattr(self.model, 'use_translations_snapshot', False) or \
+                getattr(self.model, 'cache_translations', False):
+            return queryset
+        return queryset.prefetch_related('translations')
+
+    def prefetch_translations(self, *languages):
+        return self.get_query_set().prefetch_translations(*languages)
+
+    def translated_values(self, language, fields, chunk_size=1000):
+        return self.get_query_set().translated_values(language, fields, chunk_size)
         
-    
\ No newline at end of file
@@ -1,11 +1,13 @@
-import re
+import re, threading
+from collections import OrderedDict
 from django.conf import settings
 from django.core.urlresolvers import is_valid_path, get_resolver
 from django.http import HttpResponsePermanentRedirect
 from django.middleware.locale import LocaleMiddleware
 from django.utils.cache import patch_vary_headers
 from django.utils import translation
-from utils import get_default_language, get_language_from_request, get_supported_languages
+from utils import get_default_language, get_language_from_request, get_language_resolver, \
+    sync_catalogs, sync_languages
 
 class TranslationMiddleware(LocaleMiddleware):
     """
@@ -16,18 +18,69 @@ class TranslationMiddleware(LocaleMiddleware):
     translated to the language the user desires (if the language
     is available, of course).
     """
+    #the number of default language redirect decisions to remember
+    redirect_cache_size = getattr(settings, 'TRANSLATIONS_REDIRECT_CACHE_SIZE', 1000)
+
+    def __init__(self):
+        self._prefix_regexes = {}
+        self._redirects = OrderedDict()
+        self._redirects_token = None
+        self._lock = threading.Lock()
+
+    def _get_prefix_regex(self, default):
+        """
+        Return the compiled regex matching the ``default`` language prefix.
+        """
+        try:
+            return self._prefix_regexes[default]
+        except KeyError:
+            regex = self._prefix_regexes[default] = re.compile(r'^/%s/' % re.escape(default))
+            return regex
+
+    def _is_redirect_path(self, path, language_path, urlconf, default):
+        """
+        Check if ``language_path`` is valid. Decisions are kept in a
+        bounded LRU cache that is cleared when the URLconf or the
+        default language changes.
+        """
+        #get_resolver() is memoized, a new resolver means the url caches were cleared
+        token = (default, get_resolver(None))
+        key = (urlconf, path)
+        
+        with self._lock:
+            if token != self._redirects_token:
+                self._redirects.clear()
+                self._redirects_token = token
+            elif key in self._redirects:
+                valid = self._redirects.pop(key)
+                self._redirects[key] = valid
+                return valid
+
+        valid = is_valid_path(language_path, urlconf)
+
+        with self._lock:
+            if self._redirects_token == token:
+                self._redirects[key] = valid
+                if len(self._redirects) > self.redirect_cache_size:
+                    self._redirects.popitem(last=False)
+        return valid
 
     def process_request(self, request):
         """
         Enable the default language if a supported db language can not
         be resolved.
         """
+        #pick up language and message changes made by other processes
+        sync_languages()
+        sync_catalogs()
+
         #replace the original language detection method
         language = get_language_from_request(
             request, check_path=self.is_language_prefix_patterns_used())
         
-        if language not in get_supported_languages():
-            language = get_default_language()
+        resolver = get_language_resolver()
+        if language not in resolver.supported:
+            language = resolver.default
 
         translation.activate(language)        
         request.LANGUAGE_CODE = translation.get_language()
@@ -49,11 +102,12 @@ class TranslationMiddleware(LocaleMiddleware):
             request.path_info.startswith('/%s/' % default)):
             
             urlconf = getattr(request, 'urlconf', None)
-            language_path = re.sub(r'^/%s/' % default, '/', request.path_info)
+            prefix_regex = self._get_prefix_regex(default)
+            language_path = prefix_regex.sub('/', request.path_info, 1)
             if settings.APPEND_SLASH and not language_path.endswith('/'):
                 language_path = language_path + '/'
 
-            if is_valid_path(language_path, urlconf):
+            if self._is_redirect_path(request.path_info, language_path, urlconf, default):
                 #we use a permanent redirect here.
                 #when changing the default language we need to let the world know
                 #that our links have permanently changed and transfer our seo juice 
@@ -61,7 +115,7 @@ class TranslationMiddleware(LocaleMiddleware):
                 #http://blog.yawd.eu/2012/impact-django-page-redirects-seo/
                 return  HttpResponsePermanentRedirect("%s://%s/%s" % (
                     request.is_secure() and 'https' or 'http',
-                    request.get_host(), re.sub(r'^/%s/' % default, '', request.get_full_path())))
+                    request.get_host(), prefix_regex.sub('', request.get_full_path(), 1)))
         
         patch_vary_headers(response, ('Accept-Language',))
         if 'Content-Language' not in response:
@@ -1,13 +1,11 @@
 from django.conf import settings
-from django.core.urlresolvers import clear_url_caches
 from django.db import models
-from django.db.models.signals import pre_delete, post_delete
-from django.utils.encoding import smart_str 
+from django.db.models.signals import class_prepared, pre_delete, post_delete, post_save
 from django.utils.translation import get_language, get_language_info, ugettext_lazy, ugettext as _
 from managers import TranslatableManager
-import utils
+import cache, utils
 
-import os
+import json, os
 
 USE_ELFINDER = False
 try:
@@ -53,11 +51,6 @@ class Language(models.Model):
             ("edit_translations", "Can edit the language's translation messages"),
         )
         
-    def _default_changed(self):
-        #change the default language for this thread
-        clear_url_caches()
-        utils._default = self.name
-
     def save(self, *args, **kwargs):
         """
         Override the default save() method to ensure that one and only
@@ -72,18 +65,16 @@ class Language(models.Model):
                 #make sure only one default language exists
                 default.default = False
                 default.save()
-                self._default_changed()
 
         except Language.DoesNotExist:
             #no default language was found
             #force this as the default
             self.default = True
-            self._default_changed()
 
         super(Language, self).save(*args, **kwargs)
-        #this might produce a little overhead, but it's necessary:
-        #the state of _supported could be unpredictable by now
-        utils._supported = [smart_str(l) for l in Language.objects.values_list('name', flat=True)]
+        #let all processes know the languages have changed. This also
+        #reloads the default and supported languages of this process
+        utils.invalidate_languages()
 
     def delete(self):
         """
@@ -110,6 +101,15 @@ class Translatable(models.Model):
     """
     objects = TranslatableManager()
     
+    #set to True to read translations from the django cache
+    #instead of prefetching them
+    cache_translations = False
+
+    #set to True if get_absolute_url() returns the same path in all
+    #languages, to compute the language switcher urls without
+    #activating each language
+    language_independent_urls = False
+    
     class Meta:
         abstract = True        
 
@@ -140,10 +140,46 @@ class Translatable(models.Model):
         """
         if not language_id:
             language_id = get_language()
-        #using prefetched translations
+
+        index = self._translations_index()
+        if index is not None:
+            return index.get(language_id)
+
+        if self.cache_translations and self.pk is not None:
+            cached = self.__dict__.setdefault('_cached_translations', {})
+            if language_id not in cached:
+                #load the translations of all the objects fetched along with this one
+                batch = self.__dict__.get('_translations_batch') or [self]
+                cache.load_translations([o for o in batch if not language_id in \
+                                         o.__dict__.get('_cached_translations', {})] + [self], language_id)
+            return cached[language_id]
+
         for l in self.translations.all():
             if l.language_id == language_id:
                 return l
+
+    def _translations_index(self):
+        """
+        Return a dictionary mapping language codes to the prefetched
+        translations (or the translations snapshot of a
+        :class:`translations.models.SnapshotTranslatable`), or ``None``
+        if translations are not prefetched. The index is built once
+        per prefetched queryset.
+        """
+        source = getattr(self, '_prefetched_objects_cache', {}).get('translations')
+        if source is None:
+            source = getattr(self, 'translations_snapshot', None)
+            if not getattr(self, 'use_translations_snapshot', False) or source is None:
+                return None
+
+        cached = getattr(self, '_translations_cache', None)
+        if cached is None or cached[0] is not source:
+            if isinstance(source, basestring):
+                index = self._load_translations_snapshot(source)
+            else:
+                index = dict((l.language_id, l) for l in source)
+            cached = self._translations_cache = (source, index)
+        return cached[1]
         
     def __unicode__(self):
         """
@@ -155,14 +191,95 @@ class Translatable(models.Model):
 
     def save(self, *args, **kwargs):
         """
-        Clear prefetched translations
+        Clear prefetched translations and their index
         """
         ret = super(Translatable, self).save(*args, **kwargs)
         if hasattr(self, '_prefetched_objects_cache') and 'translations' in self._prefetched_objects_cache:
             del self._prefetched_objects_cache['translations']
+        self._translations_cache = None
+        self._cached_translations = {}
         return ret
 
 
+class SnapshotTranslatable(Translatable):
+    """
+    A :class:`translations.models.Translatable` that stores a JSON
+    snapshot of all its translations in the ``translations_snapshot``
+    column. The snapshot is updated automatically whenever a translation
+    is saved or deleted, and :func:`translation` and :func:`get_name`
+    use it instead of querying the translations. Translations are not
+    prefetched by the default manager of such models.
+    
+    Use the ``translationsnapshots`` management command to fill in or
+    verify the snapshots of existing objects.
+    """
+    translations_snapshot = models.TextField(editable=False, blank=True, default='')
+    
+    use_translations_snapshot = True
+    
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def get_translations_snapshot(cls, pk, lock=False):
+        """
+        Build the snapshot of the object with the primary key ``pk``
+        from the database translations. If ``lock`` is set, the
+        translations are read with ``select_for_update()``.
+        """
+        related = cls._meta.get_field_by_name('translations')[0]
+        translations = related.model._default_manager.filter(**{related.field.attname : pk})
+        if lock:
+            translations = translations.select_for_update()
+        snapshot = {}
+        for translation in translations:
+            values = {}
+            for field in translation._meta.fields:
+                value = getattr(translation, field.attname)
+                if value is not None and not isinstance(value, (bool, int, long, float, basestring)):
+                    value = field.value_to_string(translation)
+                values[field.attname] = value
+            snapshot[translation.language_id] = values
+        return json.dumps(snapshot, sort_keys=True) if snapshot else ''
+
+    @classmethod
+    def update_translations_snapshot(cls, pk):
+        """
+        Store the up to date snapshot of the object with the primary key ``pk``.
+
+        The object is locked first, so that transactions changing its
+        translations concurrently build their snapshots one after the other,
+        each one seeing the translations committed by the previous one.
+        """
+        list(cls._default_manager.select_for_update().filter(pk=pk).values_list('pk', flat=True))
+        snapshot = cls.get_translations_snapshot(pk, lock=True)
+        cls._default_manager.filter(pk=pk).update(translations_snapshot=snapshot)
+        return snapshot
+
+    def _load_translations_snapshot(self, snapshot):
+        """
+        Create the (unsaved) translation objects of the snapshot.
+        """
+        related = self._meta.get_field_by_name('translations')[0]
+        index = {}
+        for language_id, values in (json.loads(snapshot) if snapshot else {}).items():
+            translation = related.model(**dict((f.attname, f.to_python(values.get(f.attname))) \
+                                               for f in related.model._meta.fields))
+            translation._state.adding = False
+            translation._state.db = self._state.db
+            setattr(translation, related.field.name, self)
+            index[language_id] = translation
+        return index
+
+    def save(self, *args, **kwargs):
+        """
+        Refresh the snapshot to avoid overwriting translation changes
+        made after this object was loaded.
+        """
+        if self.pk is not None:
+            self.translations_snapshot = self.get_translations_snapshot(self.pk)
+        return super(SnapshotTranslatable, self).save(*args, **kwargs)
+
 class Translation(models.Model):
     """
     This model represents the translations of a 
@@ -189,9 +306,58 @@ def post_delete_language(sender, instance, using, **kwargs):
     **Signal receiver**. Update the supported languages to ensure that 
     a 404 will be raised when requesting the language's urls
     """
-    #generate supported languages in case they are not initialized
-    utils.get_supported_languages()
-    utils._supported.remove(instance.name)
+    utils.invalidate_languages()
     
+def _translation_master_field(sender):
+    """
+    Return the ``ForeignKey`` of a translation model pointing to its
+    :class:`translations.models.Translatable`.
+    """
+    for field in sender._meta.fields:
+        if field.rel and field.rel.related_name == 'translations':
+            return field
+
+def post_save_translation(sender, instance, **kwargs):
+    """
+    **Signal receiver**. Invalidate the cached translations and update
+    the translations snapshot of :class:`translations.models.SnapshotTranslatable`
+    objects.
+    """
+    field = _translation_master_field(sender)
+    if field is None:
+        return
+
+    pk = getattr(instance, field.attname)
+    if pk is not None:
+        if getattr(field.rel.to, 'cache_translations', False):
+            cache.invalidate_translations(field.rel.to, pk)
+        if getattr(field.rel.to, 'use_translations_snapshot', False):
+            field.rel.to.update_translations_snapshot(pk)
+
+def post_save_translatable(sender, instance, **kwargs):
+    """
+    **Signal receiver**. Invalidate the cached translations (and cached
+    language switchers) of :class:`translations.models.Translatable` objects.
+    """
+    if instance.pk is not None and sender.cache_translations:
+        cache.invalidate_translations(sender, instance.pk)
+
+def prepare_translation(sender, **kwargs):
+    """
+    **Signal receiver**. Connect the translation receivers to every
+    concrete :class:`translations.models.Translation` and 
+    :class:`translations.models.Translatable` model.
+    """
+    if sender._meta.abstract:
+        return
+
+    if issubclass(sender, Translation):
+        post_save.connect(post_save_translation, sender=sender, dispatch_uid='translation-post-save-%s' % sender._meta)
+        post_delete.connect(post_save_translation, sender=sender, dispatch_uid='translation-post-delete-%s' % sender._meta)
+    elif issubclass(sender, Translatable):
+        post_save.connect(post_save_translatable, sender=sender, dispatch_uid='translatable-post-save-%s' % sender._meta)
+        post_delete.connect(post_save_translatable, sender=sender, dispatch_uid='translatable-post-delete-%s' % sender._meta)
+
 pre_delete.connect(pre_delete_language, sender=Language, dispatch_uid='language-pre-delete')
-post_delete.connect(post_delete_language, sender=Language, dispatch_uid='language-post-delete')
\ No newline at end of file
+post_delete.connect(post_delete_language, sender=Language, dispatch_uid='language-post-delete')
+class_prepared.connect(prepare_translation, dispatch_uid='translation-class-prepared')
\ No newline at end of file
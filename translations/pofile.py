@@ -0,0 +1,728 @@
+"""
+Native handling of gettext ``.po`` and ``.mo`` files.
+
+This module parses ``.po`` catalogs and compiles them to ``.mo`` files
+without depending on the gettext command line tools.
+"""
+import array, codecs, os, re, shutil, struct, sys, tempfile
+from contextlib import contextmanager
+from django.core.files import locks
+
+MO_MAGIC = 0x950412de
+CONTEXT_SEPARATOR = '\x04'
+
+class POFileError(Exception):
+    """
+    Raised when a ``.po`` file can not be parsed or compiled. The
+    ``errors`` attribute lists ``(line number, message)`` tuples.
+    """
+    def __init__(self, filename, errors):
+        self.filename = filename
+        self.errors = errors
+        super(POFileError, self).__init__('\n'.join(['%s:%d: %s' % (filename, lineno, msg) \
+                                                    for lineno, msg in errors]))
+
+class POEntry(object):
+    """
+    A single message of a ``.po`` file. ``msgstr`` holds the translation
+    of singular messages, ``msgstr_plural`` the list of translations of
+    plural messages. ``start`` and ``end`` are the byte offsets of the
+    entry in the parsed file, ``lineno`` the line of its ``msgid``.
+    """
+    __slots__ = ('msgctxt', 'msgid', 'msgid_plural', 'msgstr', 'msgstr_plural',
+                 'comments', 'flags', 'obsolete', 'lineno', 'start', 'end', 'raw')
+
+    def __init__(self):
+        self.msgctxt = None
+        self.msgid = None
+        self.msgid_plural = None
+        self.msgstr = None
+        self.msgstr_plural = None
+        self.comments = []
+        self.flags = []
+        self.obsolete = False
+        self.lineno = 0
+        self.start = None
+        self.end = None
+        self.raw = None
+
+    @property
+    def key(self):
+        """
+        The ``(msgctxt, msgid)`` tuple identifying the message.
+        """
+        return (self.msgctxt, self.msgid)
+
+    @property
+    def is_header(self):
+        return self.msgid == u'' and self.msgctxt is None
+
+    @property
+    def fuzzy(self):
+        return 'fuzzy' in self.flags
+
+    @property
+    def translated(self):
+        """
+        True if the message is translated (fuzzy messages are not compiled
+        but are considered translated).
+        """
+        if self.msgstr_plural is not None:
+            return bool(self.msgstr_plural) and all(self.msgstr_plural)
+        return bool(self.msgstr)
+
+    @property
+    def changed(self):
+        """
+        True if the source message changed since it was translated (the
+        entry holds the previous msgid as a ``#|`` comment).
+        """
+        return any(c.startswith(u'#|') for c in self.comments)
+
+    def __repr__(self):
+        return '<POEntry %r>' % (self.key,)
+
+_keyword_re = re.compile(r'^(msgctxt|msgid_plural|msgid|msgstr)(?:\[(\d+)\])?\s*(".*)$')
+_escape_re = re.compile(r'\\(?:([\\"abfnrtv?\'])|([0-7]{1,3})|x([0-9a-fA-F]{1,2}))')
+_escapes = {'\\' : '\\', '"' : '"', 'a' : '\a', 'b' : '\b', 'f' : '\f', 'n' : '\n',
+            'r' : '\r', 't' : '\t', 'v' : '\v', '?' : '?', "'" : "'"}
+_charset_re = re.compile(r'charset=([^\s;]+)', re.I)
+
+def _unescape_match(match):
+    if match.group(1):
+        return _escapes[match.group(1)]
+    if match.group(2):
+        return chr(int(match.group(2), 8) & 0xff)
+    return chr(int(match.group(3), 16))
+
+def _parse_string(line):
+    """
+    Return the contents of a quoted ``.po`` string or ``None``
+    if the line is not a valid string.
+    """
+    if len(line) < 2 or line[0] != '"' or line[-1] != '"':
+        return None
+    return _escape_re.sub(_unescape_match, line[1:-1])
+
+def get_charset(msgstr, default='utf-8'):
+    """
+    Return the charset declared in a header ``msgstr``.
+    """
+    match = _charset_re.search(msgstr)
+    return match.group(1) if match and match.group(1).upper() != 'CHARSET' else default
+
+def iter_entries(fileobj, filename='<po file>', keep_raw=False, charset='utf-8'):
+    """
+    Iterate over the :class:`translations.pofile.POEntry` entries of the
+    open (binary) ``.po`` file ``fileobj``. Entries are parsed one by one
+    so that memory usage does not depend on the size of the file. If
+    ``keep_raw`` is set, the original text of every entry is kept in the
+    ``raw`` attribute. ``charset`` is used to decode the entries until
+    a header declares another one.
+
+    Raises :class:`translations.pofile.POFileError` on syntax errors.
+    """
+    state = {'charset' : charset}
+    entry, parts, target = POEntry(), {}, None
+    raw = []
+    offset = lineno = 0
+
+    def finish():
+        """
+        Decode the collected strings and return the entry.
+        """
+        if not 'msgid' in parts:
+            raise POFileError(filename, [(lineno, 'missing msgid')])
+        if parts.get('msgstr') is None and not parts.get('plural'):
+            raise POFileError(filename, [(entry.lineno, 'missing msgstr')])
+
+        charset = state['charset']
+        msgid = ''.join(parts['msgid'])
+        if msgid == '' and not 'msgctxt' in parts and not entry.obsolete:
+            #this is the header, it defines the charset of the following entries
+            charset = state['charset'] = get_charset(''.join(parts.get('msgstr') or []))
+
+        try:
+            decode = lambda s: ''.join(s).decode(charset)
+            entry.msgid = decode(parts['msgid'])
+            if 'msgctxt' in parts:
+                entry.msgctxt = decode(parts['msgctxt'])
+            if 'msgid_plural' in parts:
+                entry.msgid_plural = decode(parts['msgid_plural'])
+                plural = parts.get('plural', {})
+                entry.msgstr_plural = [decode(plural.get(i, [])) for i in range(max(plural) + 1)] \
+                                        if plural else []
+            else:
+                entry.msgstr = decode(parts.get('msgstr') or [])
+            entry.comments = [c.decode(charset) for c in entry.comments]
+        except (UnicodeDecodeError, LookupError), e:
+            raise POFileError(filename, [(entry.lineno, 'could not decode message: %s' % e)])
+
+        if keep_raw:
+            entry.raw = ''.join(raw)
+        return entry
+
+    for line in fileobj:
+        lineno += 1
+        if lineno == 1 and line.startswith(codecs.BOM_UTF8):
+            #skip the byte order mark some editors add
+            offset += len(codecs.BOM_UTF8)
+            line = line[len(codecs.BOM_UTF8):]
+        length = len(line)
+        stripped = line.strip()
+
+        if not stripped:
+            if 'msgid' in parts:
+                yield finish()
+                entry, parts, target, raw = POEntry(), {}, None, []
+            offset += length
+            continue
+
+        obsolete = stripped.startswith('#~')
+        if obsolete:
+            stripped = stripped[2:].lstrip()
+            if stripped.startswith('|'):
+                #previous msgid of an obsolete message
+                stripped = '#' + stripped
+
+        if stripped.startswith('#'):
+            if 'msgstr' in parts or 'plural' in parts:
+                yield finish()
+                entry, parts, target, raw = POEntry(), {}, None, []
+            if entry.start is None:
+                entry.start = offset
+            entry.comments.append(stripped)
+            if stripped.startswith('#,'):
+                entry.flags.extend([f.strip() for f in stripped[2:].split(',') if f.strip()])
+        else:
+            match = _keyword_re.match(stripped)
+            if match:
+                keyword, index, value = match.groups()
+                if keyword in ('msgctxt', 'msgid') and ('msgstr' in parts or 'plural' in parts):
+                    yield finish()
+                    entry, parts, target, raw = POEntry(), {}, None, []
+                if entry.start is None:
+                    entry.start = offset
+                if keyword == 'msgid':
+                    entry.lineno = lineno
+
+                if index is not None:
+                    if keyword != 'msgstr':
+                        raise POFileError(filename, [(lineno, 'unexpected index for %s' % keyword)])
+                    target = parts.setdefault('plural', {}).setdefault(int(index), [])
+                elif keyword in parts:
+                    raise POFileError(filename, [(lineno, 'duplicate %s' % keyword)])
+                else:
+                    target = parts[keyword] = []
+                entry.obsolete = entry.obsolete or obsolete
+            elif stripped.startswith('"') and target is not None:
+                value = stripped
+            else:
+                raise POFileError(filename, [(lineno, 'syntax error')])
+
+            string = _parse_string(value)
+            if string is None:
+                raise POFileError(filename, [(lineno, 'invalid string')])
+            target.append(string)
+
+        if keep_raw:
+            raw.append(line)
+        offset += length
+        entry.end = offset
+
+    #trailing comments are ignored, as gettext does
+    if 'msgid' in parts:
+        yield finish()
+
+def read_entries(path, keep_raw=False):
+    """
+    Return the list of entries of the ``.po`` file at ``path``.
+    """
+    with open(path, 'rb') as f:
+        return list(iter_entries(f, path, keep_raw))
+
+_python_format_re = re.compile(r'%(?:\((?P<key>[^)]*)\))?[#0 +-]*(?:\*|\d+)?(?:\.(?:\*|\d+))?[hlL]?(?P<type>[diouxXeEfFgGcrs%])')
+
+def _format_directives(string):
+    named, positional = {}, []
+    for match in _python_format_re.finditer(string):
+        if match.group('type') == '%':
+            continue
+        if match.group('key') is not None:
+            named[match.group('key')] = match.group('type')
+        else:
+            positional.append(match.group('type'))
+    return named, positional
+
+def check_format(entry):
+    """
+    Validate the format strings of a ``python-format`` or ``c-format``
+    entry, the way ``msgfmt --check-format`` does. Returns a list of
+    error messages.
+    """
+    if entry.fuzzy or not ('python-format' in entry.flags or 'c-format' in entry.flags):
+        return []
+
+    errors = []
+    if entry.msgstr_plural is None:
+        checks = [(entry.msgid, entry.msgstr, True)]
+    else:
+        #as msgfmt does, all plural forms are checked against msgid_plural
+        #and may omit arguments (e.g. the count of the singular form)
+        checks = [(entry.msgid_plural, msgstr, False) for msgstr in entry.msgstr_plural]
+
+    for msgid, msgstr, strict in checks:
+        if not msgstr:
+            continue
+        id_named, id_positional = _format_directives(msgid)
+        str_named, str_positional = _format_directives(msgstr)
+        if str_named and str_positional:
+            errors.append('msgstr mixes named and unnamed format directives')
+        elif id_named or str_named:
+            for key, type_ in str_named.items():
+                if key not in id_named:
+                    errors.append("format directive '%s' does not exist in msgid" % key)
+                elif id_named[key] != type_ and not 's' in (type_, id_named[key]):
+                    errors.append("format directive '%s' type mismatch" % key)
+            if strict and set(id_named) - set(str_named):
+                errors.append("msgstr lacks the format directives %s" % \
+                              ', '.join(["'%s'" % k for k in sorted(set(id_named) - set(str_named))]))
+        elif strict:
+            if id_positional != str_positional:
+                errors.append('number or type of format directives differ from msgid '\
+                              '(%d in msgid, %d in msgstr)' % (len(id_positional), len(str_positional)))
+        else:
+            #plural forms may omit or repeat directives, but not add other types
+            for type_ in str_positional:
+                if not [t for t in id_positional if t == type_ or 's' in (t, type_)]:
+                    errors.append("format directive '%%%s' does not exist in msgid" % type_)
+    return errors
+
+def _hashpjw(string):
+    """
+    The gettext hash function (computed up to the first NUL byte).
+    """
+    h = 0
+    for c in string.split('\0', 1)[0]:
+        h = ((h << 4) + ord(c)) & 0xffffffff
+        g = h & 0xf0000000
+        if g:
+            h ^= g >> 24
+            h ^= g
+    return h
+
+def _is_prime(n):
+    if n < 2:
+        return False
+    i = 2
+    while i * i <= n:
+        if n % i == 0:
+            return False
+        i += 1
+    return True
+
+def _hash_size(count):
+    size = max(3, (count * 4) // 3)
+    while not _is_prime(size):
+        size += 1
+    return size
+
+def _message_key(entry):
+    """
+    The original string of ``entry`` in a ``.mo`` file.
+    """
+    msgid = entry.msgid if entry.msgid_plural is None else u'%s\0%s' % (entry.msgid, entry.msgid_plural)
+    if entry.msgctxt is not None:
+        msgid = u'%s%s%s' % (entry.msgctxt, CONTEXT_SEPARATOR, msgid)
+    return msgid
+
+def _message_translation(entry):
+    """
+    The translated string of ``entry`` in a ``.mo`` file, or ``None`` if
+    the entry is not compiled (fuzzy or untranslated).
+    """
+    if entry.fuzzy and not entry.is_header:
+        return None
+    if entry.msgstr_plural is not None:
+        if not entry.msgstr_plural or not entry.msgstr_plural[0]:
+            return None
+        return u'\0'.join(entry.msgstr_plural)
+    return entry.msgstr or None
+
+def _build_mo(messages):
+    """
+    Return the contents of a ``.mo`` file (including the lookup hash table)
+    holding the sorted list of ``(msgid, msgstr)`` byte string ``messages``.
+    """
+    count = len(messages)
+    hash_size = _hash_size(count)
+    originals_offset = 28
+    translations_offset = originals_offset + count * 8
+    hash_offset = translations_offset + count * 8
+    strings_offset = hash_offset + hash_size * 4
+
+    originals, translations = array.array('I'), array.array('I')
+    hash_table = array.array('I', [0] * hash_size)
+    strings = []
+    position = strings_offset
+    for msgid, msgstr in messages:
+        originals.extend([len(msgid), position])
+        strings.append(msgid + '\0')
+        position += len(msgid) + 1
+    for msgid, msgstr in messages:
+        translations.extend([len(msgstr), position])
+        strings.append(msgstr + '\0')
+        position += len(msgstr) + 1
+
+    for i, (msgid, msgstr) in enumerate(messages):
+        h = _hashpjw(msgid)
+        index = h % hash_size
+        incr = 1 + (h % (hash_size - 2))
+        while hash_table[index]:
+            index = index - (hash_size - incr) if index >= hash_size - incr else index + incr
+        hash_table[index] = i + 1
+
+    #.mo files are written in little-endian byte order
+    if sys.byteorder == 'big':
+        for table in (originals, translations, hash_table):
+            table.byteswap()
+
+    return struct.pack('<7I', MO_MAGIC, 0, count, originals_offset, translations_offset,
+                       hash_size, hash_offset) + originals.tostring() + \
+           translations.tostring() + hash_table.tostring() + ''.join(strings)
+
+def compile_entries(entries, filename='<po file>', check=True):
+    """
+    Compile ``entries`` to the contents of a ``.mo`` file (including the
+    lookup hash table). Obsolete, untranslated and fuzzy messages (except
+    for the header) are skipped, as with ``msgfmt``. If ``check`` is set,
+    format strings are validated.
+
+    Raises :class:`translations.pofile.POFileError` listing all errors.
+    """
+    messages, errors, seen = {}, [], {}
+    charset = 'utf-8'
+
+    for entry in entries:
+        if entry.obsolete:
+            continue
+        if entry.key in seen:
+            errors.append((entry.lineno, 'duplicate message definition (first defined at line %d)' % seen[entry.key]))
+            continue
+        seen[entry.key] = entry.lineno
+
+        if entry.is_header:
+            charset = get_charset(entry.msgstr)
+        elif entry.fuzzy:
+            continue
+        if check:
+            errors.extend([(entry.lineno, e) for e in check_format(entry)])
+
+        msgstr = _message_translation(entry)
+        if msgstr is not None:
+            messages[_message_key(entry)] = msgstr
+
+    if errors:
+        raise POFileError(filename, errors)
+
+    try:
+        messages = sorted([(k.encode(charset), v.encode(charset)) for k, v in messages.items()])
+    except (UnicodeEncodeError, LookupError), e:
+        raise POFileError(filename, [(0, 'could not encode messages: %s' % e)])
+    return _build_mo(messages)
+
+def read_mo(path):
+    """
+    Return a dictionary mapping the original strings of the ``.mo`` file
+    at ``path`` to the translated ones (as byte strings).
+
+    Raises :class:`translations.pofile.POFileError` if the file is invalid.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    try:
+        for order in ('<', '>'):
+            magic, revision, count, originals_offset, translations_offset = \
+                    struct.unpack(order + '5I', data[:20])
+            if magic == MO_MAGIC:
+                break
+        else:
+            raise ValueError
+        messages = {}
+        for i in range(count):
+            length, offset = struct.unpack(order + '2I', data[originals_offset + i * 8:originals_offset + i * 8 + 8])
+            msgid = data[offset:offset + length]
+            length, offset = struct.unpack(order + '2I', data[translations_offset + i * 8:translations_offset + i * 8 + 8])
+            messages[msgid] = data[offset:offset + length]
+    except (struct.error, ValueError):
+        raise POFileError(path, [(0, 'invalid .mo file')])
+    return messages
+
+def update_mo(mo_path, entry, charset='utf-8', check=True):
+    """
+    Replace the translation of ``entry`` in the ``.mo`` file at
+    ``mo_path`` (or remove it if the entry is fuzzy or untranslated)
+    without compiling the whole ``.po`` file again. ``charset`` is the
+    charset of the catalog. The file is replaced atomically.
+
+    Raises :class:`translations.pofile.POFileError` if the file is invalid,
+    or the entry does not validate or can not be encoded.
+    """
+    if check:
+        errors = check_format(entry)
+        if errors:
+            raise POFileError(mo_path, [(entry.lineno, e) for e in errors])
+
+    messages = read_mo(mo_path)
+    msgstr = _message_translation(entry)
+    try:
+        msgid = _message_key(entry).encode(charset)
+        if msgstr is None:
+            messages.pop(msgid, None)
+        else:
+            messages[msgid] = msgstr.encode(charset)
+    except (UnicodeEncodeError, LookupError), e:
+        raise POFileError(mo_path, [(entry.lineno, 'could not encode message: %s' % e)])
+    write_file(mo_path, _build_mo(sorted(messages.items())))
+
+_string_escapes = [('\\', '\\\\'), ('"', '\\"'), ('\t', '\\t'), ('\r', '\\r'), ('\n', '\\n')]
+
+def _quote(string):
+    for char, escaped in _string_escapes:
+        string = string.replace(char, escaped)
+    return u'"%s"' % string
+
+def _format_string(keyword, string, prefix=u''):
+    lines = string.splitlines(True)
+    if len(lines) < 2:
+        return [u'%s%s %s' % (prefix, keyword, _quote(string))]
+    return [u'%s%s ""' % (prefix, keyword)] + [u'%s%s' % (prefix, _quote(l)) for l in lines]
+
+def format_entry(entry):
+    """
+    Return the ``.po`` representation of ``entry`` as a unicode string
+    (without the trailing blank line).
+    """
+    prefix = u'#~ ' if entry.obsolete else u''
+    lines = []
+    for comment in entry.comments:
+        if entry.obsolete and comment.startswith(u'#|'):
+            comment = u'#~' + comment[1:]
+        lines.append(comment)
+    if entry.msgctxt is not None:
+        lines.extend(_format_string(u'msgctxt', entry.msgctxt, prefix))
+    lines.extend(_format_string(u'msgid', entry.msgid, prefix))
+    if entry.msgid_plural is not None:
+        lines.extend(_format_string(u'msgid_plural', entry.msgid_plural, prefix))
+        for i, msgstr in enumerate(entry.msgstr_plural or [u'']):
+            lines.extend(_format_string(u'msgstr[%d]' % i, msgstr, prefix))
+    else:
+        lines.extend(_format_string(u'msgstr', entry.msgstr, prefix))
+    return u'\n'.join(lines) + u'\n'
+
+class _AtomicFile(object):
+    """
+    A file opened for writing next to ``path`` that replaces ``path``
+    when closed without errors, so that readers never see a partially
+    written file.
+    """
+    def __init__(self, path, mode=0664):
+        self.path, self.mode = path, mode
+        fd, self.tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                                             prefix='.%s.' % os.path.basename(path))
+        self.file = os.fdopen(fd, 'wb')
+
+    def __enter__(self):
+        return self.file
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.file.close()
+        if exc_type is None:
+            os.chmod(self.tmp_path, self.mode)
+            os.rename(self.tmp_path, self.path)
+        elif os.path.exists(self.tmp_path):
+            os.unlink(self.tmp_path)
+
+def write_file(path, data, mode=0664):
+    """
+    Atomically replace the file at ``path`` with ``data``, so that
+    readers never see a partially written file.
+    """
+    with _AtomicFile(path, mode) as f:
+        f.write(data)
+
+@contextmanager
+def file_lock(path):
+    """
+    Hold an exclusive lock on a hidden ``.lock`` file next to ``path``, so
+    that read-modify-write cycles of ``path`` are serialized across
+    threads and processes.
+    """
+    with open(os.path.join(os.path.dirname(path), '.%s.lock' % os.path.basename(path).lstrip('.')), 'ab') as f:
+        locks.lock(f, locks.LOCK_EX)
+        try:
+            yield
+        finally:
+            locks.unlock(f)
+
+def compile_file(po_path, mo_path=None, check=True):
+    """
+    Compile the ``.po`` file at ``po_path`` to ``mo_path`` (by default
+    the same path with a ``.mo`` extension).
+    """
+    if mo_path is None:
+        mo_path = os.path.splitext(po_path)[0] + '.mo'
+    with open(po_path, 'rb') as f:
+        data = compile_entries(iter_entries(f, po_path), po_path, check)
+    write_file(mo_path, data)
+    return mo_path
+
+def _iter_merged(sources, output):
+    """
+    Write the entries of the ``sources`` files to ``output`` keeping the
+    first definition of every message, and yield the written entries.
+    """
+    seen = set()
+    for path in sources:
+        with open(path, 'rb') as f:
+            rewrite = None
+            for entry in iter_entries(f, path, keep_raw=True):
+                if rewrite is None:
+                    #entries are copied verbatim unless they must be re-encoded
+                    rewrite = entry.is_header and \
+                                get_charset(entry.msgstr).lower().replace('_', '-') not in ('utf-8', 'utf8', 'ascii')
+                if entry.obsolete:
+                    #obsolete messages never shadow the active ones of the following files
+                    continue
+                if entry.key in seen:
+                    continue
+                seen.add(entry.key)
+
+                if entry.is_header and rewrite:
+                    entry.msgstr = _charset_re.sub('charset=UTF-8', entry.msgstr)
+                output.write(format_entry(entry).encode('utf-8') if rewrite else entry.raw)
+                output.write('\n')
+                yield entry
+
+def merge_files(sources, po_path, mo_path=None, check=True):
+    """
+    Merge the ``.po`` files ``sources`` into ``po_path``, the way
+    ``msgcat --use-first`` does: the first definition of a message wins
+    and the header of the first file is kept. Files are streamed and only
+    the message keys are held in memory. Obsolete messages are dropped.
+
+    If ``mo_path`` is given, the merged catalog is compiled to it in the
+    same pass. Raises :class:`translations.pofile.POFileError` if a file
+    can not be parsed or the merged catalog can not be compiled, in which
+    case neither file is replaced.
+    """
+    with _AtomicFile(po_path) as output:
+        entries = _iter_merged(sources, output)
+        if mo_path is None:
+            for entry in entries:
+                pass
+        else:
+            data = compile_entries(entries, po_path, check)
+    if mo_path is not None:
+        write_file(mo_path, data)
+
+class POIndex(object):
+    """
+    The byte offsets of the (non obsolete) entries of a ``.po`` file,
+    keyed by ``(msgctxt, msgid)``. ``signature`` identifies the version
+    of the file the offsets refer to.
+    """
+    def __init__(self, signature, charset, offsets):
+        self.signature = signature
+        self.charset = charset
+        self.offsets = offsets
+
+_indexes = {}
+
+def _signature(path):
+    st = os.stat(path)
+    return (st.st_mtime, st.st_size, st.st_ino)
+
+def get_index(path):
+    """
+    Return the :class:`translations.pofile.POIndex` of the ``.po`` file at
+    ``path``. Indexes are kept in memory and the file is parsed again
+    only when its modification time, size or inode change.
+    """
+    signature = _signature(path)
+    index = _indexes.get(path)
+    if index is None or index.signature != signature:
+        offsets, charset = {}, 'utf-8'
+        with open(path, 'rb') as f:
+            for entry in iter_entries(f, path):
+                if entry.is_header:
+                    charset = get_charset(entry.msgstr)
+                if not entry.obsolete:
+                    offsets[entry.key] = (entry.start, entry.end)
+        index = _indexes[path] = POIndex(signature, charset, offsets)
+    return index
+
+def read_entry(path, key):
+    """
+    Return the entry of the ``.po`` file at ``path`` identified by ``key``
+    (a ``(msgctxt, msgid)`` tuple), or ``None`` if there is no such entry.
+    Only the entry itself is read from the file.
+    """
+    for attempt in range(2):
+        index = get_index(path)
+        if not key in index.offsets:
+            return None
+        start, end = index.offsets[key]
+        with open(path, 'rb') as f:
+            f.seek(start)
+            entries = list(iter_entries(f.read(end - start).splitlines(True), path,
+                                        charset=index.charset))
+        if len(entries) == 1 and entries[0].key == key:
+            entry = entries[0]
+            entry.start, entry.end = start, end
+            return entry
+        #the file was replaced since it was indexed
+        _indexes.pop(path, None)
+    return None
+
+def _copy_range(src, dst, length):
+    while length > 0:
+        data = src.read(min(length, 65536))
+        if not data:
+            break
+        dst.write(data)
+        length -= len(data)
+
+def write_entry(path, entry):
+    """
+    Replace the entry of the ``.po`` file at ``path`` having the key of
+    ``entry`` with ``entry``. The rest of the file is copied untouched
+    and the file is replaced atomically, holding the :func:`file_lock`
+    of ``path``.
+
+    Raises ``KeyError`` if the file has no such entry and
+    :class:`translations.pofile.POFileError` if the entry can not
+    be encoded in the charset of the file.
+    """
+    with file_lock(path):
+        with open(path, 'rb') as src:
+            #the index is checked after opening the file it refers to
+            index = get_index(path)
+            start, end = index.offsets[entry.key]
+            try:
+                data = format_entry(entry).encode(index.charset)
+            except (UnicodeEncodeError, LookupError), e:
+                raise POFileError(path, [(entry.lineno, 'could not encode message: %s' % e)])
+
+            with _AtomicFile(path, os.fstat(src.fileno()).st_mode & 0777) as dst:
+                _copy_range(src, dst, start)
+                dst.write(data)
+                src.seek(end)
+                shutil.copyfileobj(src, dst)
+
+        #shift the offsets of the following entries instead of parsing the file again
+        delta = len(data) - (end - start)
+        offsets = dict([(k, (s + delta, e + delta) if s >= end else (s, e)) \
+                        for k, (s, e) in index.offsets.items()])
+        offsets[entry.key] = (start, start + len(data))
+        _indexes[path] = POIndex(_signature(path), index.charset, offsets)
@@ -0,0 +1,166 @@
+"""
+Translation statistics of the message catalogs.
+
+The number of translated, fuzzy, untranslated and obsolete messages of
+each catalog is stored in a file of the ``LOCALE_PATHS`` folder, keyed by
+the sha1 hash of the catalog contents. A manifest maps each catalog to its
+modification time, size and hash, so catalogs that did not change are not
+even opened, and a catalog is parsed again only when its contents change.
+"""
+import hashlib, json, os, threading
+from django.conf import settings
+from pofile import POFileError, file_lock, iter_entries, write_file
+
+STATS_NAME = '.yawd-translations-stats.json'
+
+COUNTS = ('translated', 'fuzzy', 'untranslated', 'obsolete')
+
+def count_entries(fileobj, filename='<po file>'):
+    """
+    Return the ``[translated, fuzzy, untranslated, obsolete]`` message counts
+    of a ``.po`` file. Fuzzy messages are only counted as fuzzy.
+    """
+    counts = [0, 0, 0, 0]
+    for entry in iter_entries(fileobj, filename):
+        if entry.is_header:
+            continue
+        if entry.obsolete:
+            counts[3] += 1
+        elif entry.fuzzy:
+            counts[1] += 1
+        elif entry.translated:
+            counts[0] += 1
+        else:
+            counts[2] += 1
+    return counts
+
+def summarize(counts):
+    """
+    Return a dictionary of the ``counts`` (as returned by
+    :func:`count_entries`), along with the ``total`` number of active
+    messages and the translated ``percent``. Returns ``None`` if the
+    counts are unknown (e.g. the catalog is invalid).
+    """
+    if counts is None:
+        return None
+    stats = dict(zip(COUNTS, counts))
+    stats['total'] = total = sum(counts[:3])
+    stats['percent'] = int(100 * counts[0] / total) if total else 100
+    return stats
+
+class CatalogStats(object):
+    """
+    The statistics of all the catalogs found under ``root``, stored in the
+    ``path`` file. The file is shared by all processes; it is read again
+    when another process changes it and updated under a file lock.
+    """
+    def __init__(self, root, path):
+        self.root = root
+        self.path = path
+        self._signature = None
+        self._files = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            st = os.stat(self.path)
+            signature = (st.st_mtime, st.st_size, st.st_ino)
+        except OSError:
+            signature = None
+        if signature is not None and signature == self._signature:
+            return
+
+        try:
+            with open(self.path, 'rb') as f:
+                data = json.load(f)
+            self._files, self._counts = dict(data['files']), dict(data['counts'])
+        except (IOError, ValueError, KeyError, TypeError):
+            self._files, self._counts = {}, {}
+        self._signature = signature
+
+    def _save(self):
+        #drop the counts of contents no catalog has anymore
+        used = set([record[2] for record in self._files.values()])
+        self._counts = dict([(h, c) for h, c in self._counts.items() if h in used])
+        write_file(self.path, json.dumps({'files' : self._files, 'counts' : self._counts}))
+        st = os.stat(self.path)
+        self._signature = (st.st_mtime, st.st_size, st.st_ino)
+
+    def get(self, po_path, po_files):
+        """
+        Return a dictionary mapping each of the ``po_files`` catalogs of the
+        ``po_path`` folder to its ``[translated, fuzzy, untranslated,
+        obsolete]`` counts (``None`` for invalid catalogs). Missing files
+        are left out.
+        """
+        prefix = os.path.relpath(po_path, self.root)
+        result = {}
+        with self._lock:
+            self._load()
+            files, counts = {}, {}
+            for po_file in po_files:
+                path = os.path.join(po_path, po_file)
+                key = os.path.join(prefix, po_file)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                signature = [st.st_mtime, st.st_size]
+                record = self._files.get(key)
+                if not record or record[:2] != signature or not record[2] in self._counts:
+                    with open(path, 'rb') as f:
+                        digest = hashlib.sha1(f.read()).hexdigest()
+                        if digest in self._counts:
+                            counts[digest] = self._counts[digest]
+                        elif not digest in counts:
+                            f.seek(0)
+                            try:
+                                counts[digest] = count_entries(f, po_file)
+                            except POFileError:
+                                counts[digest] = None
+                    record = files[key] = signature + [digest]
+                result[po_file] = counts[record[2]] if record[2] in counts else self._counts[record[2]]
+
+            #forget the catalogs removed from the folder
+            removed = [key for key in self._files if os.path.dirname(key) == prefix and \
+                       not os.path.basename(key) in result]
+
+            if files or removed:
+                #apply the changes to the latest version of the file, other
+                #processes may have changed it in the meantime
+                with file_lock(self.path):
+                    self._load()
+                    self._counts.update(counts)
+                    self._files.update(files)
+                    for key in removed:
+                        self._files.pop(key, None)
+                    self._save()
+        return result
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+def get_catalog_stats(po_path, po_files):
+    """
+    Return a dictionary mapping each of the ``po_files`` catalogs of the
+    ``po_path`` folder (one of the ``LC_MESSAGES`` folders of
+    ``LOCALE_PATHS[0]``) to its statistics (see :func:`summarize`).
+    """
+    root = settings.LOCALE_PATHS[0]
+    with _stats_lock:
+        stats = _stats.get(root)
+        if stats is None:
+            stats = _stats[root] = CatalogStats(root, os.path.join(root, STATS_NAME))
+    return dict([(f, summarize(c)) for f, c in stats.get(po_path, po_files).items()])
+
+def get_total_stats(stats):
+    """
+    Return the statistics of a set of catalogs, given the ``stats``
+    dictionary returned by :func:`get_catalog_stats`. Returns ``None``
+    if there are no valid catalogs.
+    """
+    catalogs = [s for s in stats.values() if s is not None]
+    if not catalogs:
+        return None
+    return summarize([sum([s[c] for s in catalogs]) for c in COUNTS])
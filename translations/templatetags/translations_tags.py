@@ -1,12 +1,18 @@
+from hashlib import md5
 from django import template
-from django.utils.translation import get_language, activate
-from translations.models import Translatable, Language
+from django.core.urlresolvers import get_script_prefix, get_urlconf
+from django.template.loader import get_template
+from django.utils.encoding import force_bytes
+from django.utils.translation import get_language
+from translations.cache import get_fragment
+from translations.models import Translatable
+from translations.utils import get_language_resolver, get_languages, get_translation_urls
 
 
 register = template.Library()
 
 
-@register.inclusion_tag('language_switcher.html', takes_context=True)
+@register.simple_tag(takes_context=True)
 def translation_urls(context, object_=None):
     """
     This simple tag returns all language urls of an object
@@ -16,32 +22,36 @@ def translation_urls(context, object_=None):
     
     If ``object_`` is a string, the tag assumes its a URL and will just
     prepend the appropriate language prefix.
+    
+    Urls are computed by :func:`translations.utils.get_translation_urls`,
+    without activating each language, and are rendered using the
+    ``language_switcher.html`` template. The output is cached for
+    :class:`translations.models.Translatable` objects whose translations
+    are cached, strings and ``None``; the cached output is invalidated
+    when the object, its translations or the languages change.
     """
-    current_language = get_language()
     #use the translations.context_processors.languages context processor if
-    #available, to avoid extra queries
-    langs = context['langs'] if 'langs' in context else Language.objects.all()
-    urls = [] 
-    
-    for lang in langs:
-        activate(lang.pk)
-        url = ''
+    #available
+    langs = context['langs'] if 'langs' in context else get_languages()
 
-        if object_ and hasattr(object_, 'get_absolute_url'):
-            url = object_.get_absolute_url()
-        elif isinstance(object_, Translatable):
-            translation = object_.translation()
-            if translation and hasattr(translation, 'get_absolute_url'):
-                url = translation.get_absolute_url()
-        elif isinstance(object_, str) or isinstance(object_, unicode):
-            url = '/%s%s' % (lang.pk, object_) if not lang.default else object_
- 
-        #in case there is no url for this language redirect to the
-        #language's index page
-        if not url: 
-            url = '/%s/' % lang.pk if not lang.default else '/'
+    def render():
+        new_context = template.Context({ 'urls' : get_translation_urls([object_], langs)[0] },
+                                       autoescape=context.autoescape,
+                                       current_app=context.current_app,
+                                       use_l10n=context.use_l10n,
+                                       use_tz=context.use_tz)
+        return get_template('language_switcher.html').render(new_context)
 
-        urls.append({'language': lang, 'url': url })
+    if isinstance(object_, Translatable) and object_.pk is not None and object_.cache_translations:
+        model, pk, identity = type(object_), object_.pk, '%s:%s' % (object_._meta, object_.pk)
+    elif object_ is None or isinstance(object_, basestring):
+        model, pk, identity = None, None, 'url:%s' % object_
+    else:
+        #no way to tell when the output changes
+        return render()
 
-    activate(current_language)
-    return { 'urls' : urls }
+    key = '|'.join([identity, str(get_language_resolver().version), get_language(),
+                    str(get_urlconf()), get_script_prefix(), context.autoescape and '1' or '0',
+                    ','.join([l.pk for l in langs])])
+    key = 'yawd-translations:switcher:%s' % md5(force_bytes(key)).hexdigest()
+    return get_fragment(key, render, model, pk)
@@ -0,0 +1,589 @@
+import csv, datetime, json, os, shutil, tempfile, time
+from StringIO import StringIO
+import django
+from django.conf.urls import url
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+from django.db import models
+from django.db.models.query import ITER_CHUNK_SIZE
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+from django.utils.translation import activate, deactivate
+from bulk import ConflictError, export_translations, import_translations
+from cache import _invalidate_pending_translations, get_translations_version
+from generation import Manifest, update_unified_catalog
+from jobs import JobConflictError, _Heartbeat, _acquire, _get_paths, _is_stale, _release, submit_job
+from models import Language, SnapshotTranslatable, Translatable, Translation
+from pofile import POEntry, POFileError, check_format, compile_entries, read_entries, update_mo, write_file
+from stats import STATS_NAME, CatalogStats
+import stats as stats_module
+from urls import translation_patterns
+from utils import LANGUAGES_VERSION_KEY, _invalidate_pending_languages, get_default_language, \
+        get_languages_version, get_supported_languages, get_translation_urls, get_translations_cache, \
+        sync_languages
+from views import TranslationMessageEntryView
+
+class Article(Translatable):
+    #urls only differ in their language prefix
+    language_independent_urls = True
+
+    class Meta:
+        app_label = 'translations'
+
+    def get_absolute_url(self):
+        return reverse('translations-test-article', args=[self.pk])
+
+class ArticleTranslation(Translation):
+    article = models.ForeignKey(Article, related_name='translations')
+    title = models.CharField(max_length=20)
+    published = models.DateField(blank=True, null=True)
+
+    class Meta:
+        app_label = 'translations'
+
+class CachedArticle(Translatable):
+    cache_translations = True
+
+    class Meta:
+        app_label = 'translations'
+
+class CachedArticleTranslation(Translation):
+    article = models.ForeignKey(CachedArticle, related_name='translations')
+    title = models.CharField(max_length=20)
+
+    class Meta:
+        app_label = 'translations'
+
+class SnapshotArticle(SnapshotTranslatable):
+
+    class Meta:
+        app_label = 'translations'
+
+class SnapshotArticleTranslation(Translation):
+    article = models.ForeignKey(SnapshotArticle, related_name='translations')
+    title = models.CharField(max_length=20)
+    published = models.DateField(blank=True, null=True)
+
+    class Meta:
+        app_label = 'translations'
+
+class Page(object):
+    """
+    An object served by a pattern outside the translation patterns.
+    """
+    def get_absolute_url(self):
+        return reverse('translations-test-page')
+
+def _view(request, *args):
+    return HttpResponse()
+
+#the url patterns of the url tests
+urlpatterns = [url(r'^page/$', _view, name='translations-test-page')] + translation_patterns('',
+    url(r'^article/(\d+)/$', _view, name='translations-test-article'),
+)
+
+def _entry(msgid, msgstr=u'', msgid_plural=None, msgstr_plural=None, flags=('python-format',)):
+    entry = POEntry()
+    entry.msgid, entry.msgstr, entry.flags = msgid, msgstr, list(flags)
+    entry.msgid_plural, entry.msgstr_plural = msgid_plural, msgstr_plural
+    return entry
+
+class CheckFormatTest(SimpleTestCase):
+
+    def test_singular(self):
+        self.assertEqual(check_format(_entry(u'%(name)s saved', u'%(name)s gespeichert')), [])
+        self.assertTrue(check_format(_entry(u'%(name)s saved', u'gespeichert')))
+        self.assertTrue(check_format(_entry(u'%d saved', u'%s %d gespeichert')))
+
+    def test_plural_forms_use_msgid_plural(self):
+        entry = _entry(u'one comment', msgid_plural=u'%(count)s comments',
+                       msgstr_plural=[u'%(count)s Kommentar', u'%(count)s Kommentare'])
+        self.assertEqual(check_format(entry), [])
+
+    def test_plural_forms_may_omit_or_repeat_directives(self):
+        entry = _entry(u'one file', msgid_plural=u'%d files',
+                       msgstr_plural=[u'eine Datei', u'%d Dateien, %d'])
+        self.assertEqual(check_format(entry), [])
+
+    def test_plural_forms_reject_unknown_directives(self):
+        entry = _entry(u'one file', msgid_plural=u'%(count)d files',
+                       msgstr_plural=[u'%(other)d Datei', u'%(count)d Dateien'])
+        self.assertTrue(check_format(entry))
+        entry = _entry(u'one file', msgid_plural=u'%d files', msgstr_plural=[u'%f Datei', u'%d Dateien'])
+        self.assertTrue(check_format(entry))
+
+    def test_django_catalogs_compile(self):
+        """
+        All the catalogs shipped with django compile with the format checks.
+        """
+        failed = []
+        for dirpath, dirnames, filenames in os.walk(os.path.dirname(django.__file__)):
+            for filename in filenames:
+                if filename.endswith('.po'):
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        compile_entries(read_entries(path), path)
+                    except POFileError, e:
+                        failed.append(unicode(e))
+        self.assertEqual(failed, [])
+
+class UpdateMoTest(SimpleTestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.mo_path = os.path.join(self.path, 'django.mo')
+        self.entries = [_entry(u'', u'Content-Type: text/plain; charset=UTF-8\n', flags=()),
+                        _entry(u'%(name)s saved', u'%(name)s gespeichert'),
+                        _entry(u'one file', msgid_plural=u'%d files', msgstr_plural=[u'eine Datei', u'%d Dateien']),
+                        _entry(u'untranslated')]
+        write_file(self.mo_path, compile_entries(self.entries))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def assertCompiled(self, entries):
+        with open(self.mo_path, 'rb') as f:
+            self.assertEqual(f.read(), compile_entries(entries))
+
+    def test_update(self):
+        self.entries[3].msgstr = u'\xfcbersetzt'
+        update_mo(self.mo_path, self.entries[3])
+        self.entries[2].msgstr_plural = [u'%d Datei', u'%d Dateien']
+        update_mo(self.mo_path, self.entries[2])
+        self.assertCompiled(self.entries)
+
+    def test_fuzzy_messages_are_removed(self):
+        self.entries[1].flags.append('fuzzy')
+        update_mo(self.mo_path, self.entries[1])
+        self.assertCompiled(self.entries)
+
+    def test_invalid_format(self):
+        self.entries[1].msgstr = u'gespeichert'
+        self.assertRaises(POFileError, update_mo, self.mo_path, self.entries[1])
+
+class TranslationsTestCase(TestCase):
+    """
+    Create the ``en`` (default), ``de`` and ``fr`` languages, starting
+    with an empty translations cache.
+    """
+    def setUp(self):
+        get_translations_cache().clear()
+        activate('en')
+        for name in ('en', 'de', 'fr'):
+            Language(name=name).save()
+
+    def tearDown(self):
+        deactivate()
+        _invalidate_pending_languages()
+        _invalidate_pending_translations()
+        #the languages of this process are reloaded from the database
+        get_translations_cache().clear()
+
+class LanguagesTest(TranslationsTestCase):
+
+    def test_default_language(self):
+        self.assertEqual(get_default_language(), 'en')
+        self.assertEqual(sorted(get_supported_languages()), ['de', 'en', 'fr'])
+        with self.assertNumQueries(0):
+            sync_languages()
+            get_default_language()
+
+    def test_changes_of_other_processes(self):
+        #another process changes the languages
+        Language.objects.filter(name='en').update(default=False)
+        Language.objects.filter(name='de').update(default=True)
+        sync_languages()
+        self.assertEqual(get_default_language(), 'en')
+
+        #and notifies all processes
+        get_translations_cache().incr(LANGUAGES_VERSION_KEY)
+        sync_languages()
+        self.assertEqual(get_default_language(), 'de')
+
+    def test_changes_in_transactions(self):
+        version = get_languages_version()
+        Language(name='el').save()
+        self.assertEqual(get_languages_version(), version + 1)
+        self.assertTrue('el' in get_supported_languages())
+
+        #the version is increased again after the request
+        _invalidate_pending_languages()
+        self.assertEqual(get_languages_version(), version + 2)
+        _invalidate_pending_languages()
+        self.assertEqual(get_languages_version(), version + 2)
+
+class CachedTranslationsTest(TranslationsTestCase):
+
+    def setUp(self):
+        super(CachedTranslationsTest, self).setUp()
+        for title in ('one', 'two', 'three'):
+            article = CachedArticle.objects.create()
+            CachedArticleTranslation.objects.create(article=article, language_id='en', title=title)
+
+    def _titles(self):
+        return [a.translation('en').title for a in CachedArticle.objects.order_by('pk')]
+
+    def test_translations_are_cached(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(self._titles(), ['one', 'two', 'three'])
+        with self.assertNumQueries(1):
+            self.assertEqual(self._titles(), ['one', 'two', 'three'])
+
+        #missing translations are cached as well
+        articles = list(CachedArticle.objects.order_by('pk'))
+        with self.assertNumQueries(1):
+            self.assertEqual(articles[0].translation('de'), None)
+            self.assertEqual(articles[1].translation('de'), None)
+        with self.assertNumQueries(1):
+            self.assertEqual([a.translation('de') for a in CachedArticle.objects.all()], [None] * 3)
+
+    def test_invalidation(self):
+        self.assertEqual(self._titles(), ['one', 'two', 'three'])
+        translation = CachedArticleTranslation.objects.get(title='two')
+        version = get_translations_version(CachedArticle, translation.article_id)
+        translation.title = 'zwei'
+        translation.save()
+        self.assertEqual(get_translations_version(CachedArticle, translation.article_id), version + 1)
+        with self.assertNumQueries(2):
+            self.assertEqual(self._titles(), ['one', 'zwei', 'three'])
+
+        #the version is increased again after the request
+        _invalidate_pending_translations()
+        self.assertEqual(get_translations_version(CachedArticle, translation.article_id), version + 2)
+
+        translation.delete()
+        self.assertEqual(CachedArticle.objects.get(pk=translation.article_id).translation('en'), None)
+
+    def test_batches(self):
+        for i in range(ITER_CHUNK_SIZE):
+            CachedArticle.objects.create()
+        articles = list(CachedArticle.objects.order_by('pk'))
+        self.assertEqual(len(articles[0]._translations_batch), ITER_CHUNK_SIZE)
+        self.assertTrue(articles[0]._translations_batch is articles[ITER_CHUNK_SIZE - 1]._translations_batch)
+        self.assertEqual(articles[-3:], articles[-1]._translations_batch)
+
+        #objects are not linked when iterating explicitly
+        article = next(CachedArticle.objects.order_by('pk').iterator())
+        self.assertFalse('_translations_batch' in article.__dict__)
+
+class SnapshotTest(TranslationsTestCase):
+
+    def setUp(self):
+        super(SnapshotTest, self).setUp()
+        self.article = SnapshotArticle.objects.create()
+
+    def test_snapshot_updates(self):
+        translation = SnapshotArticleTranslation.objects.create(article=self.article, language_id='en',
+                                                                title='one', published=datetime.date(2013, 1, 2))
+        article = SnapshotArticle.objects.get(pk=self.article.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(article.translation('en').title, 'one')
+            self.assertEqual(article.translation('en').published, datetime.date(2013, 1, 2))
+            self.assertEqual(article.translation('de'), None)
+        self.assertEqual(article.translations_snapshot, SnapshotArticle.get_translations_snapshot(article.pk))
+
+        translation.delete()
+        article = SnapshotArticle.objects.get(pk=self.article.pk)
+        self.assertEqual(article.translations_snapshot, '')
+        self.assertEqual(article.translation('en'), None)
+
+    def test_save_keeps_the_snapshot(self):
+        #the translation is added after the object was loaded
+        SnapshotArticleTranslation.objects.create(article=self.article, language_id='de', title='eins')
+        self.article.save()
+        self.assertEqual(SnapshotArticle.objects.get(pk=self.article.pk).translation('de').title, 'eins')
+
+class TranslationUrlsTest(TranslationsTestCase):
+    urls = 'translations.tests'
+
+    def _urls(self, obj):
+        return dict([(u['language'].name, u['url']) for u in get_translation_urls([obj])[0]])
+
+    def test_translation_urls(self):
+        article = Article.objects.create()
+        expected = {'en' : '/article/%s/' % article.pk, 'de' : '/de/article/%s/' % article.pk,
+                    'fr' : '/fr/article/%s/' % article.pk}
+        self.assertEqual(self._urls(article), expected)
+        activate('de')
+        self.assertEqual(self._urls(article), expected)
+
+    def test_other_urls(self):
+        self.assertEqual(self._urls(Page()), {'en' : '/page/', 'de' : '/page/', 'fr' : '/page/'})
+        self.assertEqual(self._urls('/about/'), {'en' : '/about/', 'de' : '/de/about/', 'fr' : '/fr/about/'})
+        self.assertEqual(self._urls(None), {'en' : '/', 'de' : '/de/', 'fr' : '/fr/'})
+
+class ManifestTest(SimpleTestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.manifest_path = os.path.join(self.path, 'manifest.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_languages_are_saved_separately(self):
+        first, second = Manifest(self.manifest_path), Manifest(self.manifest_path)
+        first.language('en')['apps']['translations'] = {}
+        second.language('de')['apps']['translations'] = {}
+        first.save('en')
+        second.save('de')
+        self.assertEqual(sorted(Manifest(self.manifest_path).data), ['de', 'en'])
+
+        first.clear('en')
+        first.save('en')
+        self.assertEqual(sorted(Manifest(self.manifest_path).data), ['de'])
+
+class JobLockTest(TranslationsTestCase):
+
+    def setUp(self):
+        super(JobLockTest, self).setUp()
+        self.path = tempfile.mkdtemp()
+        self.lock_path = os.path.join(self.path, 'job.lock')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        super(JobLockTest, self).tearDown()
+
+    def test_acquire_and_release(self):
+        self.assertTrue(_acquire(self.lock_path, 'first'))
+        self.assertFalse(_acquire(self.lock_path, 'second'))
+        _release(self.lock_path, 'second')
+        self.assertTrue(os.path.exists(self.lock_path))
+        _release(self.lock_path, 'first')
+        self.assertFalse(os.path.exists(self.lock_path))
+        self.assertTrue(_acquire(self.lock_path, 'second'))
+
+    def test_stale_locks_are_taken_over(self):
+        self.assertTrue(_acquire(self.lock_path, 'first'))
+        os.utime(self.lock_path, (0, 0))
+        self.assertTrue(_is_stale(self.lock_path))
+        self.assertTrue(_acquire(self.lock_path, 'second'))
+        #the interrupted job does not release the lock of the new one
+        _release(self.lock_path, 'first')
+        self.assertTrue(os.path.exists(self.lock_path))
+        self.assertEqual(os.listdir(self.path), ['job.lock'])
+
+    def test_heartbeat(self):
+        with self.settings(TRANSLATIONS_JOB_TIMEOUT=2):
+            self.assertTrue(_acquire(self.lock_path, 'first'))
+            os.utime(self.lock_path, (time.time() - 1.9, time.time() - 1.9))
+            heartbeat = _Heartbeat(self.lock_path, 'first')
+            heartbeat.start()
+            try:
+                time.sleep(1.5)
+                self.assertFalse(_is_stale(self.lock_path))
+            finally:
+                heartbeat.stop()
+                heartbeat.join()
+
+    def test_conflicting_jobs(self):
+        with self.settings(LOCALE_PATHS=(self.path,)):
+            state_path, lock_path = _get_paths('de')
+            os.makedirs(os.path.dirname(state_path))
+            job = {'id' : 'running', 'language' : 'de', 'delete' : False, 'status' : 'running'}
+            write_file(state_path, json.dumps(job))
+            self.assertTrue(_acquire(lock_path, 'running'))
+
+            self.assertEqual(submit_job('de'), job)
+            self.assertRaises(JobConflictError, submit_job, 'de', True)
+
+_CATALOG = '''msgid ""
+msgstr ""
+"Content-Type: text/plain; charset=UTF-8\\n"
+"Plural-Forms: nplurals=2; plural=(n != 1);\\n"
+
+#, python-format
+msgid "Hello %(name)s"
+msgstr ""
+
+msgid "one file"
+msgid_plural "%(count)s files"
+msgstr[0] ""
+msgstr[1] ""
+
+#, fuzzy
+msgid "Save"
+msgstr "Sichern"
+'''
+
+class TranslationMessageEntryTest(TranslationsTestCase):
+
+    def setUp(self):
+        super(TranslationMessageEntryTest, self).setUp()
+        self.path = tempfile.mkdtemp()
+        self.po_path = os.path.join(self.path, 'de', 'LC_MESSAGES')
+        os.makedirs(self.po_path)
+        write_file(os.path.join(self.po_path, 'translations-django.po'), _CATALOG)
+        write_file(os.path.join(self.po_path, 'django.contrib.auth-django.po'),
+                   _CATALOG.replace('msgstr "Sichern"', 'msgstr "Speichern"'))
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.factory = RequestFactory()
+        self.settings_override = override_settings(LOCALE_PATHS=(self.path,))
+        self.settings_override.enable()
+        update_unified_catalog('de', self.po_path, 'django')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.path)
+        super(TranslationMessageEntryTest, self).tearDown()
+
+    def _request(self, method, data):
+        request = getattr(self.factory, method)('/', data)
+        request.user = self.user
+        response = TranslationMessageEntryView.as_view()(request, 'de', 'translations-django.po')
+        return response.status_code, json.loads(response.content)
+
+    def _read_unified(self):
+        result = []
+        for name in ('django.po', 'django.mo'):
+            with open(os.path.join(self.po_path, name), 'rb') as f:
+                result.append(f.read())
+        return result
+
+    def test_read(self):
+        status, data = self._request('get', {'msgid' : 'Save'})
+        self.assertEqual(status, 200)
+        self.assertEqual((data['msgstr'], data['fuzzy']), (u'Sichern', True))
+
+    def test_update(self):
+        status, data = self._request('post', {'msgid' : 'Hello %(name)s', 'msgstr' : 'Hallo %(name)s'})
+        self.assertEqual(status, 200)
+        self.assertEqual(self._request('get', {'msgid' : 'Hello %(name)s'})[1]['msgstr'], u'Hallo %(name)s')
+
+        status, data = self._request('post', {'msgid' : 'one file', 'fuzzy' : '1',
+                                              'msgstr_plural' : ['eine Datei', '%(count)s Dateien']})
+        self.assertEqual(status, 200)
+        self.assertEqual((data['msgstr_plural'], data['fuzzy']), ([u'eine Datei', u'%(count)s Dateien'], True))
+
+        #the unified catalog is the one a full merge creates
+        unified = self._read_unified()
+        update_unified_catalog('de', self.po_path, 'django')
+        self.assertEqual(unified, self._read_unified())
+
+    def test_invalid_updates(self):
+        status, data = self._request('post', {'msgid' : 'Hello %(name)s', 'msgstr' : 'Hallo'})
+        self.assertEqual(status, 400)
+        self.assertTrue(data['errors'])
+
+        status, data = self._request('post', {'msgid' : 'one file', 'msgstr_plural' : ['eine Datei']})
+        self.assertEqual(status, 400)
+        self.assertEqual(self._request('get', {'msgid' : 'one file'})[1]['msgstr_plural'], [u'', u''])
+
+class CatalogStatsTest(SimpleTestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.stats_path = os.path.join(self.path, STATS_NAME)
+        for locale in ('de', 'fr'):
+            po_path = os.path.join(self.path, locale, 'LC_MESSAGES')
+            os.makedirs(po_path)
+            write_file(os.path.join(po_path, 'translations-django.po'), _CATALOG)
+        self.de_path = os.path.join(self.path, 'de', 'LC_MESSAGES')
+        self.fr_path = os.path.join(self.path, 'fr', 'LC_MESSAGES')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_counts(self):
+        write_file(os.path.join(self.de_path, 'invalid.po'), 'msgid "unterminated\n')
+        stats = CatalogStats(self.path, self.stats_path).get(self.de_path,
+                ['translations-django.po', 'invalid.po', 'missing.po'])
+        self.assertEqual(stats, {'translations-django.po' : [0, 1, 2, 0], 'invalid.po' : None})
+
+    def test_stats_are_shared(self):
+        first, second = CatalogStats(self.path, self.stats_path), CatalogStats(self.path, self.stats_path)
+        count_entries = stats_module.count_entries
+        def concurrent_count_entries(*args):
+            #another process stores its counts while the catalog is counted
+            stats_module.count_entries = count_entries
+            first.get(self.de_path, ['translations-django.po'])
+            return count_entries(*args)
+        stats_module.count_entries = concurrent_count_entries
+        try:
+            second.get(self.fr_path, ['translations-django.po'])
+        finally:
+            stats_module.count_entries = count_entries
+        with open(self.stats_path, 'rb') as f:
+            self.assertEqual(sorted(json.load(f)['files']), [os.path.join('de', 'LC_MESSAGES', 'translations-django.po'),
+                                                             os.path.join('fr', 'LC_MESSAGES', 'translations-django.po')])
+
+        #the counts are read from the file, not the catalog
+        os.utime(os.path.join(self.de_path, 'translations-django.po'), (0, 0))
+        stats = CatalogStats(self.path, self.stats_path)
+        self.assertEqual(stats.get(self.fr_path, ['translations-django.po']), {'translations-django.po' : [0, 1, 2, 0]})
+
+        #removed catalogs are forgotten
+        os.remove(os.path.join(self.fr_path, 'translations-django.po'))
+        self.assertEqual(stats.get(self.fr_path, ['translations-django.po']), {})
+        with open(self.stats_path, 'rb') as f:
+            self.assertEqual(sorted(json.load(f)['files']), [os.path.join('de', 'LC_MESSAGES', 'translations-django.po')])
+
+class BulkTest(TranslationsTestCase):
+
+    def setUp(self):
+        super(BulkTest, self).setUp()
+        self.first, self.second = Article.objects.create(), Article.objects.create()
+        ArticleTranslation.objects.create(article=self.first, language_id='en', title='one',
+                                          published=datetime.date(2013, 1, 2))
+        ArticleTranslation.objects.create(article=self.second, language_id='de', title='zwei')
+
+    def _rows(self):
+        return sorted(ArticleTranslation.objects.values_list('article', 'language', 'title', 'published'))
+
+    def _import(self, rows, **kwargs):
+        return import_translations(Article, StringIO(''.join([json.dumps(r) + '\n' for r in rows])), **kwargs)
+
+    def test_export_and_import(self):
+        rows = self._rows()
+        for format in ('jsonl', 'csv'):
+            fileobj = StringIO()
+            self.assertEqual(export_translations(Article, fileobj, format), 2)
+            ArticleTranslation.objects.all().delete()
+            fileobj.seek(0)
+            self.assertEqual(import_translations(Article, fileobj, format),
+                             {'created' : 2, 'updated' : 0, 'skipped' : 0, 'invalid' : 0})
+            self.assertEqual(self._rows(), rows)
+
+        fileobj = StringIO()
+        export_translations(Article, fileobj, 'csv', languages=['de'])
+        self.assertEqual(list(csv.reader(StringIO(fileobj.getvalue()))),
+                         [['master', 'language', 'title', 'published'], [str(self.second.pk), 'de', 'zwei', '']])
+
+    def test_updates_keep_other_fields(self):
+        result = self._import([{'master' : self.first.pk, 'language' : 'en', 'title' : 'first'},
+                               {'master' : self.first.pk, 'language' : 'de', 'title' : 'eins'},
+                               {'master' : self.first.pk, 'language' : 'de', 'title' : 'erste'}])
+        self.assertEqual(result, {'created' : 1, 'updated' : 2, 'skipped' : 0, 'invalid' : 0})
+        self.assertEqual(self._rows(), [(self.first.pk, u'de', u'erste', None),
+                                        (self.first.pk, u'en', u'first', datetime.date(2013, 1, 2)),
+                                        (self.second.pk, u'de', u'zwei', None)])
+
+    def test_invalid_rows(self):
+        result = self._import([{'master' : self.first.pk, 'language' : 'en', 'title' : 'x' * 21},
+                               {'master' : self.first.pk, 'language' : 'de', 'title' : None},
+                               {'master' : self.first.pk, 'language' : 'fr', 'published' : 'yesterday'},
+                               {'master' : self.first.pk, 'language' : 'el', 'title' : 'ena'},
+                               {'master' : 'first', 'language' : 'fr', 'title' : 'un'},
+                               {'master' : 0, 'language' : 'fr', 'title' : 'un'},
+                               {'language' : 'fr', 'title' : 'un'}])
+        self.assertEqual(result, {'created' : 0, 'updated' : 0, 'skipped' : 0, 'invalid' : 7})
+
+        fileobj = StringIO('master,language,title,published\n%s,fr,un,\n' % self.first.pk)
+        self.assertEqual(import_translations(Article, fileobj, 'csv')['created'], 1)
+        self.assertEqual(ArticleTranslation.objects.get(language='fr').published, None)
+
+    def test_invalid_files(self):
+        self.assertRaises(ValueError, self._import, [{'master' : self.first.pk, 'language' : 'en', 'name' : 'one'}])
+        self.assertRaises(ValueError, import_translations, Article, StringIO('language,title\nen,one\n'), 'csv')
+        self.assertRaises(ValueError, import_translations, Article, StringIO('[1, 2]\n'))
+        self.assertEqual(self._rows()[0][2], u'one')
+
+    def test_conflicts(self):
+        rows = [{'master' : self.first.pk, 'language' : 'en', 'title' : 'first'},
+                {'master' : self.second.pk, 'language' : 'en', 'title' : 'two'}]
+        self.assertEqual(self._import(rows, conflict='skip'),
+                         {'created' : 1, 'updated' : 0, 'skipped' : 1, 'invalid' : 0})
+        self.assertEqual(self._rows()[0][2], u'one')
+        self.assertRaises(ConflictError, self._import, rows, conflict='error')
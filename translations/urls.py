@@ -23,10 +23,51 @@ class TranslationRegexURLResolver(LocaleRegexURLResolver):
 
     Rather than taking a regex argument, we just override the ``regex``
     function to always return the active language-code as regex.
+    
+    Compiled regexes and reverse dictionaries are kept per language and
+    are only invalidated when the default language changes.
     """
+    def __init__(self, *args, **kwargs):
+        super(TranslationRegexURLResolver, self).__init__(*args, **kwargs)
+        self._default_language = None
+
+    def _check_default_language(self):
+        default = get_default_language()
+        if default != self._default_language:
+            #the default language prefix is empty, the tables
+            #for the old and new default language are stale
+            self._regex_dict = {}
+            self._reverse_dict = {}
+            self._namespace_dict = {}
+            self._app_dict = {}
+            self._default_language = default
+        return default
 
     @property
     def regex(self):
-        if get_language() == get_default_language():
-            return re.compile(r'')
-        return super(TranslationRegexURLResolver, self).regex
\ No newline at end of file
+        default = self._check_default_language()
+        language_code = get_language()
+        try:
+            return self._regex_dict[language_code]
+        except KeyError:
+            if language_code == default:
+                regex_compiled = re.compile(r'', re.UNICODE)
+            else:
+                regex_compiled = re.compile('^%s/' % language_code, re.UNICODE)
+            self._regex_dict[language_code] = regex_compiled
+            return regex_compiled
+
+    @property
+    def reverse_dict(self):
+        self._check_default_language()
+        return super(TranslationRegexURLResolver, self).reverse_dict
+
+    @property
+    def namespace_dict(self):
+        self._check_default_language()
+        return super(TranslationRegexURLResolver, self).namespace_dict
+
+    @property
+    def app_dict(self):
+        self._check_default_language()
+        return super(TranslationRegexURLResolver, self).app_dict
@@ -1,11 +1,170 @@
-import locale, os, sys
+import locale, os, re, sys, threading, time
 from django.conf import settings
+from django.core.cache import get_cache
+from django.core.signals import request_finished
+from django.db import connections, transaction
 from django.utils.translation import check_for_language
 from django.utils.encoding import smart_str 
-from django.utils.translation.trans_real import get_language_from_path, to_locale
+from django.utils.translation.trans_real import to_locale
+from pofile import compile_file, merge_files
 
+#the language registry snapshot of this process
 _default = None
 _supported = []
+_version = None
+_language_rows = []
+_languages = None
+
+_cache = None
+
+#languages changed in a transaction of the current thread
+_pending = threading.local()
+
+LANGUAGES_VERSION_KEY = 'yawd-translations:languages:version'
+LANGUAGES_SNAPSHOT_KEY = 'yawd-translations:languages:snapshot'
+CATALOG_VERSION_KEY = 'yawd-translations:catalog:%s:version'
+
+#the message catalog versions loaded by this process
+_catalog_versions = {}
+_catalogs_checked = 0
+
+def get_translations_cache():
+	"""
+	Return the cache backend used to share state among processes. The
+	``TRANSLATIONS_CACHE`` setting names the backend to use (defaults
+	to ``'default'``). Use a backend that is shared among your
+	workers (e.g. memcached) for the changes to propagate.
+	"""
+	global _cache
+
+	if _cache is None:
+		_cache = get_cache(getattr(settings, 'TRANSLATIONS_CACHE', 'default'))
+	return _cache
+
+def get_cache_timeout():
+	"""
+	Return the timeout for the shared cache entries (``TRANSLATIONS_CACHE_TIMEOUT``
+	setting, defaults to 30 days).
+	"""
+	return getattr(settings, 'TRANSLATIONS_CACHE_TIMEOUT', 2592000)
+
+def _new_version():
+	#a time-based initial value ensures an expired counter will not
+	#be mistaken for a version a process has already loaded
+	return int(time.time() * 1000)
+
+def get_languages_version():
+	"""
+	Return the shared version of the language registry. The version
+	changes every time a :class:`translations.models.Language` is
+	saved or deleted in any process.
+	"""
+	cache = get_translations_cache()
+	version = cache.get(LANGUAGES_VERSION_KEY)
+	if version is None:
+		cache.add(LANGUAGES_VERSION_KEY, _new_version(), get_cache_timeout())
+		version = cache.get(LANGUAGES_VERSION_KEY)
+	return version
+
+def _build_languages_snapshot(version):
+	"""
+	Query the database for the default and supported languages.
+	"""
+	fallback = False
+	try:
+		from models import Language
+		languages = list(Language.objects.values_list('name', 'default', 'image', 'order'))
+	except:
+		#e.g. the table is not created yet
+		languages, fallback = [], True
+
+	supported = [smart_str(l[0]) for l in languages]
+	default = [smart_str(l[0]) for l in languages if l[1]]
+
+	return {
+		'version' : version,
+		#if no languages are set use the default language
+		'default' : default[0] if default else settings.LANGUAGE_CODE,
+		'supported' : supported if supported else [settings.LANGUAGE_CODE],
+		'languages' : languages,
+		'fallback' : fallback,
+	}
+
+def _load_languages(version):
+	"""
+	Load the registry snapshot for ``version``, using the shared
+	copy if one exists and querying the database otherwise.
+	"""
+	global _default, _supported, _version, _language_rows
+
+	cache = get_translations_cache()
+	snapshot = cache.get(LANGUAGES_SNAPSHOT_KEY)
+	if snapshot is None or snapshot.get('version') != version or not 'languages' in snapshot:
+		snapshot = _build_languages_snapshot(version)
+		if not snapshot['fallback']:
+			cache.set(LANGUAGES_SNAPSHOT_KEY, snapshot, get_cache_timeout())
+
+	if _default is not None and _default != snapshot['default']:
+		#url resolvers cache their patterns per language and the
+		#default language is not prefixed
+		from django.core.urlresolvers import clear_url_caches
+		clear_url_caches()
+
+	_default = snapshot['default']
+	_supported = snapshot['supported']
+	_language_rows = snapshot['languages']
+	#the languages are queried again until the database can be read
+	_version = version if not snapshot.get('fallback') else None
+
+def sync_languages():
+	"""
+	Reload the languages of this process if they changed in another
+	process. This costs a single cache lookup and is called by the
+	:class:`translations.middleware.TranslationMiddleware` on
+	every request.
+	"""
+	version = get_languages_version()
+	if version != _version:
+		_load_languages(version)
+
+def _increase_languages_version():
+	cache = get_translations_cache()
+	try:
+		version = cache.incr(LANGUAGES_VERSION_KEY)
+	except ValueError:
+		#the counter does not exist (e.g. expired)
+		version = _new_version()
+		cache.set(LANGUAGES_VERSION_KEY, version, get_cache_timeout())
+
+	cache.delete(LANGUAGES_SNAPSHOT_KEY)
+	return version
+
+def invalidate_languages():
+	"""
+	Notify all processes that the languages have changed and reload
+	the languages of the current process.
+
+	Other processes can not see the changes before they are committed.
+	If a transaction is open (e.g. in the admin views), the version is
+	increased again when the request finishes, so that snapshots built
+	from the old rows in the meantime are discarded. Code changing the
+	languages in a transaction outside a request should call this
+	function again after committing.
+	"""
+	_load_languages(_increase_languages_version())
+	if any([transaction.is_managed(using=alias) for alias in connections]):
+		_pending.languages = True
+
+def _invalidate_pending_languages(**kwargs):
+	"""
+	**Signal receiver**. Increase the languages version once more after a
+	request that changed the languages in a transaction.
+	"""
+	if getattr(_pending, 'languages', False):
+		_pending.languages = False
+		_increase_languages_version()
+
+request_finished.connect(_invalidate_pending_languages, dispatch_uid='translations-pending-languages')
 
 def get_default_language():
 	"""
@@ -13,16 +172,12 @@ def get_default_language():
 	If no default language is present, the default
 	settings.LANGUAGE_CODE is used.
 	
-	This will reload its values in the context of a new thread.
+	The value is read from the language registry snapshot of this
+	process (see :func:`translations.utils.sync_languages`), so no
+	database queries are produced.
 	"""
-	global _default
-	
-	if _default is None:
-		try:
-			from models import Language
-			_default = smart_str(Language.objects.get(default=True).name)
-		except:
-			_default = settings.LANGUAGE_CODE
+	if _version is None:
+		sync_languages()
 
 	return _default
 
@@ -30,17 +185,112 @@ def get_supported_languages():
 	"""
 	Retrieve the supported languages.
 	"""
-	global _supported
-	
-	if not _supported:
+	if _version is None:
+		sync_languages()
+
+	return _supported
+
+def get_languages():
+	"""
+	Return a tuple of the :class:`translations.models.Language` objects
+	(ordered as in the database). The objects are created from the language
+	registry snapshot once per registry version, so no database queries
+	are produced. They should be treated as read-only.
+	"""
+	global _languages
+
+	if _version is None:
+		sync_languages()
+
+	languages = _languages
+	if languages is None or languages[0] != _version:
 		from models import Language
-		_supported = [smart_str(l) for l in Language.objects.values_list('name', flat=True)]
+		objects = []
+		for name, default, image, order in _language_rows:
+			language = Language(name=name, default=default, image=image, order=order)
+			language._state.adding = False
+			objects.append(language)
+		languages = _languages = (_version, tuple(objects))
+	return languages[1]
 
-		#if no languages are set use the default language
-		if not _supported:
-			_supported = [settings.LANGUAGE_CODE]
+class LanguageResolver(object):
+	"""
+	Lookup tables for resolving the language of a request, built once
+	per language registry version. All checks, including the
+	``check_for_language`` file lookups, are performed when the resolver
+	is created so that resolving a request needs no filesystem access.
+	"""
 
-	return _supported
+	def __init__(self, version, default, supported):
+		self.version = version
+		self.default = default
+		self.supported = frozenset(supported)
+		#matches the language prefix of a path, longest codes first
+		self.prefix_regex = re.compile(r'^/(%s)/' % '|'.join([re.escape(l) \
+				for l in sorted(supported, key=len, reverse=True)]))
+		#supported languages having a message catalog
+		self.available = frozenset([l for l in supported if check_for_language(l)])
+		
+		#map known codes to the language they fall back to,
+		#e.g. if fr-ca is not supported fallback to fr
+		self.fallback = {}
+		for code in set([l[0] for l in settings.LANGUAGES]) | self.supported:
+			lang_code = self._fallback(code)
+			if lang_code is not None:
+				self.fallback[code] = lang_code
+
+	def _fallback(self, lang_code):
+		if lang_code in self.supported:
+			return lang_code if lang_code in self.available else None
+		lang_code = lang_code.split('-')[0]
+		return lang_code if lang_code in self.available else None
+
+	def strip_prefix(self, path):
+		"""
+		Remove the language prefix (if any) from ``path``.
+		"""
+		return self.prefix_regex.sub('/', path, 1)
+
+	def from_path(self, path):
+		"""
+		Return the language of the ``path`` prefix, if any.
+		"""
+		lang_code = path[1:].partition('/')[0]
+		return lang_code if lang_code in self.available else None
+
+	def from_session(self, lang_code):
+		"""
+		Return the session language if it is available.
+		"""
+		return lang_code if lang_code in self.available else None
+
+	def from_cookie(self, lang_code):
+		"""
+		Return the language a cookie value resolves to, if any.
+		"""
+		if not lang_code:
+			return None
+		if lang_code in self.fallback:
+			return self.fallback[lang_code]
+		#arbitrary cookie values are not memoized
+		return self._fallback(lang_code)
+
+_resolver = None
+
+def get_language_resolver():
+	"""
+	Return the :class:`translations.utils.LanguageResolver` of the
+	current language registry version.
+	"""
+	global _resolver
+
+	if _version is None:
+		sync_languages()
+
+	resolver = _resolver
+	if resolver is None or resolver.version != _version:
+		resolver = _resolver = LanguageResolver(_version, _default, _supported)
+	return resolver
 
 def get_language_from_request(request, check_path=False):
 	"""
@@ -56,89 +306,363 @@ def get_language_from_request(request, check_path=False):
     If check_path is True, the URL path prefix will be checked for a language
     code, otherwise this is skipped for backwards compatibility.
     """
-	#retrieve list of supported languages
-	supported = get_supported_languages()
+	resolver = get_language_resolver()
 
 	if check_path:
-		lang_code = get_language_from_path(request.path_info, [settings.LANGUAGE_CODE].append(supported))
+		lang_code = resolver.from_path(request.path_info)
 		if lang_code is not None:
 			return lang_code
 
 	if hasattr(request, 'session'):
-		lang_code = request.session.get('django_language', None)
-		if lang_code in supported and lang_code is not None and check_for_language(lang_code):
+		lang_code = resolver.from_session(request.session.get('django_language', None))
+		if lang_code is not None:
 			return lang_code
 
-	lang_code = request.COOKIES.get(settings.LANGUAGE_COOKIE_NAME)
-
-	if lang_code and lang_code not in supported:
-		lang_code = lang_code.split('-')[0] # e.g. if fr-ca is not supported fallback to fr
-
-	if lang_code and lang_code in supported and check_for_language(lang_code):
+	lang_code = resolver.from_cookie(request.COOKIES.get(settings.LANGUAGE_COOKIE_NAME))
+	if lang_code is not None:
 		return lang_code
 
 	#original Django middleware used to look for the Accept-Language 
 	#HTTP header and extract the language. This is replaced in our
 	#mechanism
-	return get_default_language()
+	return resolver.default
+
+def translate_url(url, language_id, current=None):
+	"""
+	Return the equivalent of ``url`` for the language ``language_id``,
+	by replacing the language prefix of the url. ``url`` is expected to
+	have been generated (e.g. by ``reverse()``) while the ``current``
+	language (defaults to the active language) was active. This does not
+	activate any language, thus it assumes the URL patterns themselves
+	are not translated (see :func:`is_translation_url`).
+	"""
+	from django.core.urlresolvers import get_script_prefix
+	from django.utils.translation import get_language
+
+	default = get_language_resolver().default
+	current = current or get_language()
+	script_prefix = get_script_prefix()
+
+	if not url.startswith(script_prefix):
+		return url
+
+	path = url[len(script_prefix):]
+	if current != default and (path == current or path.startswith('%s/' % current)):
+		path = path[len(current) + 1:]
+	if language_id != default:
+		path = '%s/%s' % (language_id, path)
+	return script_prefix + path
+
+def is_translation_url(url):
+	"""
+	Check that ``url`` (generated in the active language) is served by
+	the patterns of :func:`translations.urls.translation_patterns`, so
+	that only its language prefix differs among languages.
+	"""
+	from urlparse import urlsplit
+	from django.core.urlresolvers import Resolver404, get_resolver, get_script_prefix, get_urlconf
+	from urls import TranslationRegexURLResolver
+
+	script_prefix = get_script_prefix()
+	if not url.startswith(script_prefix):
+		return False
+	path = urlsplit(url[len(script_prefix):]).path
+
+	#the first matching root pattern serves the url
+	for pattern in get_resolver(get_urlconf()).url_patterns:
+		try:
+			if pattern.resolve(path) is not None:
+				return isinstance(pattern, TranslationRegexURLResolver)
+		except Resolver404:
+			pass
+	return False
+
+def _get_object_url(object_, language_id):
+	from models import Translatable
+
+	if object_ and hasattr(object_, 'get_absolute_url'):
+		return object_.get_absolute_url()
+	if isinstance(object_, Translatable):
+		translation = object_.translation(language_id)
+		if translation and hasattr(translation, 'get_absolute_url'):
+			return translation.get_absolute_url()
+	return ''
+
+def _swap_object_urls(object_, languages, current):
+	"""
+	Return the urls of ``object_`` computed in the active language and
+	re-prefixed for each language, or ``None`` if they are not served by
+	the translation patterns. The urls of an object are generated by the
+	same pattern, so only the first one is resolved.
+	"""
+	from models import Translatable
+
+	if object_ and hasattr(object_, 'get_absolute_url'):
+		if isinstance(object_, Translatable) and not object_.language_independent_urls:
+			#get_absolute_url() may use the translation of the active language
+			return None
+		url = object_.get_absolute_url()
+		object_urls = [url] * len(languages)
+	else:
+		object_urls = [_get_object_url(object_, lang.pk) for lang in languages]
+
+	first = [url for url in object_urls if url][:1]
+	if first and not is_translation_url(first[0]):
+		return None
+	return [translate_url(url, lang.pk, current) if url else '' for lang, url in zip(languages, object_urls)]
+
+def get_translation_urls(objects, languages=None):
+	"""
+	Return the urls of each one of ``objects`` for every language, as a list
+	holding a ``[{'language' : language, 'url' : url}, ...]`` list per object.
+	``languages`` defaults to :func:`translations.utils.get_languages`.
+	
+	An object's url is retrieved using its ``get_absolute_url()`` method (or the
+	method of its :class:`translations.models.Translation` for each language).
+	If the url is served by the translation patterns, it is retrieved in the
+	active language only and the urls of the other languages are computed with
+	:func:`translations.utils.translate_url`; otherwise (and for `Translatable`
+	objects with their own ``get_absolute_url()``, unless their
+	``language_independent_urls`` attribute is set) each language is activated
+	to retrieve its url. Strings are treated as urls without a language prefix.
+	If there is no url for a language, the language's home page is used.
+	"""
+	from django.utils.translation import activate, get_language
+
+	if languages is None:
+		languages = get_languages()
+	current = get_language()
+	result = []
+
+	for object_ in objects:
+		if isinstance(object_, basestring):
+			lang_urls = ['/%s%s' % (lang.pk, object_) if not lang.default else object_ for lang in languages]
+		else:
+			lang_urls = _swap_object_urls(object_, languages, current)
+			if lang_urls is None:
+				lang_urls = []
+				try:
+					for lang in languages:
+						activate(lang.pk)
+						lang_urls.append(_get_object_url(object_, lang.pk))
+				finally:
+					activate(current)
+
+		urls = []
+		for lang, lang_url in zip(languages, lang_urls):
+			#in case there is no url for this language redirect to the
+			#language's index page
+			if not lang_url:
+				lang_url = '/%s/' % lang.pk if not lang.default else '/'
+
+			urls.append({'language': lang, 'url': lang_url })
+		result.append(urls)
+
+	return result
 
 def compile_message_file(fn):
 	"""
 	Accepts a .po file path as argument and generates an appropriate .mo file.
-	This copies the needed functionality from the original compilemessages command
+	The file is compiled natively (see :func:`translations.pofile.compile_file`)
+	and format strings are checked, as ``msgfmt --check-format`` would do.
+	
+	Raises :class:`translations.pofile.POFileError` if the file is not valid.
 	"""
+	compile_file(fn)
 	
-	pf = os.path.splitext(fn)[0]
-	# Store the names of the .mo and .po files in an environment
-	# variable, rather than doing a string replacement into the
-	# command, so that we can take advantage of shell quoting, to
-	# quote any malicious characters/escaping.
-	# See http://cyberelk.net/tim/articles/cmdline/ar01s02.html
-	os.environ['djangocompilemo'] = pf + '.mo'
-	os.environ['djangocompilepo'] = pf + '.po'
-	if sys.platform == 'win32': # Different shell-variable syntax
-		cmd = 'msgfmt --check-format -o "%djangocompilemo%" "%djangocompilepo%"'
-	else:
-		cmd = 'msgfmt --check-format -o "$djangocompilemo" "$djangocompilepo"'
-	os.system(cmd)
-	os.chmod(pf + '.mo', 0664)
+def concat_message_files(files, fn, compile=False):
+	"""
+	Accepts a list of po files and a target file and merges the files
+	natively (see :func:`translations.pofile.merge_files`), the first
+	translation of each message being used as with ``msgcat --use-first``.
+	If ``compile`` is set the corresponding .mo file is generated as well.
 	
-def concat_message_files(files, fn):
+	Raises :class:`translations.pofile.POFileError` if the files are not valid.
 	"""
-	Accepts a list of po files and a target file and uses the
-	msgcat command to concat the files.
+	merge_files(files, fn, os.path.splitext(fn)[0] + '.mo' if compile else None)
+	
+def get_catalog_check_interval():
 	"""
+	Return the minimum number of seconds between two checks for catalogs
+	changed by other processes (``TRANSLATIONS_CATALOG_CHECK_INTERVAL``
+	setting, defaults to 1 second).
+	"""
+	return getattr(settings, 'TRANSLATIONS_CATALOG_CHECK_INTERVAL', 1)
 
-	files_str = ' '.join(files)
+def sync_catalogs():
+	"""
+	Reload the message catalogs of the languages whose messages were
+	changed by another process (see :func:`translations.utils.reset_translations`).
+	The shared catalog versions are checked with a single cache lookup at most
+	once per ``TRANSLATIONS_CATALOG_CHECK_INTERVAL`` seconds. This is called by
+	the :class:`translations.middleware.TranslationMiddleware` on every request.
+	"""
+	global _catalogs_checked
+
+	now = time.time()
+	if now - _catalogs_checked < get_catalog_check_interval():
+		return
+	_catalogs_checked = now
+
+	keys = dict([(CATALOG_VERSION_KEY % lang, lang) for lang in get_supported_languages()])
+	versions = get_translations_cache().get_many(keys.keys())
+	for key, lang in keys.items():
+		version = versions.get(key)
+		if not lang in _catalog_versions:
+			#the first version seen is the one this process started with
+			_catalog_versions[lang] = version
+			if use_mapped_catalogs():
+				#replace the catalogs django parses in memory
+				reload_translations(lang)
+		elif _catalog_versions[lang] != version:
+			_catalog_versions[lang] = version
+			reload_translations(lang)
 
-	os.environ['djangosourcepo'] = files_str
-	os.environ['djangotargetpo'] = fn
-	
-	if sys.platform == 'win32': # Different shell-variable syntax
-		cmd = 'msgcat --use-first -o "%djangotargetpo%" %djangosourcepo%'
-	else:
-		cmd = 'msgcat --use-first -o "$djangotargetpo" $djangosourcepo'
-	os.system(cmd)
-	os.chmod(fn, 0664)
-	
 def reset_translations(lang):
 	"""
-	Empty django's internal translations dictionary when a message translation
-	changes or the translations list is regenerated.
+	Reload the messages of a language when a message translation changes
+	or the translations list is regenerated. The catalog version of the
+	language is updated in the shared cache so that all processes reload
+	the messages of this language (see :func:`translations.utils.sync_catalogs`).
+	"""
+	cache = get_translations_cache()
+	key = CATALOG_VERSION_KEY % lang
+	try:
+		version = cache.incr(key)
+	except ValueError:
+		version = _new_version()
+		cache.set(key, version, get_cache_timeout())
+
+	_catalog_versions[lang] = version
+	reload_translations(lang)
+
+def _load_catalog(path, lang):
+	"""
+	Load the django catalog of ``lang`` found in the ``path`` locale folder,
+	the way ``gettext.translation`` does but without its cache, so that the
+	cached catalogs of other translation objects are never shared or mutated.
+	"""
+	from django.utils.translation.trans_real import DjangoTranslation
+	import gettext
+
+	result = None
+	for mofile in gettext.find('django', path, [to_locale(lang)], all=1):
+		with open(mofile, 'rb') as fp:
+			t = DjangoTranslation(fp)
+		if result is None:
+			result = t
+		else:
+			result.add_fallback(t)
+	if result is not None:
+		result.set_language(lang)
+	return result
+
+def use_mapped_catalogs():
+	return getattr(settings, 'TRANSLATIONS_MMAP_CATALOGS', False)
+
+def build_translation(lang, fallback=None):
+	"""
+	Build a new django translation object for ``lang`` from the .mo files,
+	merging the catalogs the way ``django.utils.translation.trans_real``
+	does: django's catalog, then the catalogs of the installed applications
+	and the ``LOCALE_PATHS`` catalogs. ``fallback`` is returned if no catalog
+	exists for this language. The translation objects in use are not modified.
+	
+	If the ``TRANSLATIONS_MMAP_CATALOGS`` setting is set, the unified catalog
+	of ``LOCALE_PATHS[0]`` is served from a memory mapped file (see
+	:class:`translations.catalogs.MappedTranslation`), the other catalogs
+	being merged in its fallback translation.
+	"""
+	from django.utils.importlib import import_module
+	import gettext
+
+	paths = [os.path.join(os.path.dirname(sys.modules[settings.__module__].__file__), 'locale')]
+	for appname in reversed(settings.INSTALLED_APPS):
+		paths.append(os.path.join(os.path.dirname(import_module(appname).__file__), 'locale'))
+	paths.extend(reversed(settings.LOCALE_PATHS))
+
+	mapped = None
+	if use_mapped_catalogs() and settings.LOCALE_PATHS:
+		#the unified catalog is merged last, serve it from a memory map
+		mofile = gettext.find('django', settings.LOCALE_PATHS[0], [to_locale(lang)])
+		if mofile:
+			from catalogs import MappedTranslation
+			with open(mofile, 'rb') as fp:
+				mapped = MappedTranslation(fp)
+			mapped.set_language(lang)
+			paths.remove(settings.LOCALE_PATHS[0])
+
+	res = None
+	for path in paths:
+		if not os.path.isdir(path):
+			continue
+		t = _load_catalog(path, lang)
+		if t is not None:
+			if res is None:
+				res = t
+			else:
+				res.merge(t)
+
+	if mapped is not None:
+		if res is not None:
+			mapped.add_fallback(res)
+		res = mapped
+
+	if res is None:
+		return fallback if fallback is not None else gettext.NullTranslations()
+	return res
+
+def reload_translations(lang):
+	"""
+	Reload django's internal translations of a language in this process
+	from the .mo files. The new translation objects are built aside and
+	swapped in, so that requests being served keep a consistent catalog.
+	The catalogs of the other languages are kept.
 	"""
 	from django.utils import translation
 	from django.utils.translation import trans_real
 	import gettext
+	global _resolver
 	
-	if lang in trans_real._translations:
-		del trans_real._translations[lang]
-	
-	gettext._translations = {}
+	#catalogs might have been created for this language,
+	#re-evaluate the available languages
+	_resolver = None
+
+	locale = to_locale(lang)
+	#the country variants of a language include its messages
+	affected = lambda code: code == lang or to_locale(code).startswith(locale + '_')
+
+	default = trans_real._translations.get(settings.LANGUAGE_CODE)
+	if affected(settings.LANGUAGE_CODE):
+		new_default = build_translation(settings.LANGUAGE_CODE)
+		if isinstance(new_default, trans_real.DjangoTranslation):
+			trans_real._translations[settings.LANGUAGE_CODE] = new_default
+		else:
+			#django does not keep empty translations
+			trans_real._translations.pop(settings.LANGUAGE_CODE, None)
+		if trans_real._default is not None:
+			trans_real._default = new_default
+	else:
+		new_default = default
+
+	translations = dict(trans_real._translations)
+	translations.setdefault(lang, None)
+	for code, t in translations.items():
+		if code == settings.LANGUAGE_CODE:
+			continue
+		if affected(code):
+			trans_real._translations[code] = build_translation(code, new_default)
+		elif default is not None and t is default:
+			#languages without catalogs use the default language translation
+			trans_real._translations[code] = new_default
 
-	if settings.LANGUAGE_CODE == lang:
-		trans_real._default = None
+	#gettext caches the .mo files by (class, path), catalogs
+	#loaded from now on must not use the outdated files
+	for key in list(gettext._translations):
+		if os.path.basename(os.path.dirname(os.path.dirname(key[1]))) == locale:
+			gettext._translations.pop(key, None)
 	
 	#force current thread translations reload
 	current_lang = translation.get_language()
-	if current_lang == lang:
-		translation.activate(current_lang)
\ No newline at end of file
+	if affected(current_lang) or affected(settings.LANGUAGE_CODE):
+		translation.activate(current_lang)
@@ -1,21 +1,64 @@
-import os, shutil
+import json, os
 from django.conf import settings
 from django.contrib import messages
 from django.core.exceptions import PermissionDenied
-from django.core import management
-from django.core.management.commands.compilemessages import has_bom
-from django.http import Http404
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.http import Http404, HttpResponse
 from django.http import HttpResponseRedirect
+from django.template import RequestContext
+from django.template.loader import render_to_string
 from django.utils.encoding import smart_str
-from django.utils.importlib import import_module
+from django.utils.html import escape
 from django.utils.text import capfirst
 from django.utils.translation import to_locale, ugettext as _
-from django.views.generic import TemplateView, FormView
+from django.views.generic import TemplateView, FormView, View
+from browser import CHANGED, FUZZY, UNTRANSLATED, get_catalog_index
 from forms import PoFileForm
+from generation import update_unified_catalog, update_unified_entry
+from jobs import JobConflictError, get_job, get_po_path, submit_job
 from models import Language
-from utils import compile_message_file, concat_message_files, reset_translations
+from pofile import POFileError, check_format, file_lock, read_entry, write_entry, write_file
+from stats import get_catalog_stats, get_total_stats
+
+def get_domain(po_file):
+    """
+    Return the gettext domain of a catalog file name.
+    """
+    return 'djangojs' if po_file.endswith('djangojs.po') else 'django'
+
+def is_app_catalog(po_file):
+    """
+    Check that ``po_file`` names an application catalog (e.g.
+    ``myapp-django.po``) and not another file or the unified catalogs.
+    """
+    return os.path.basename(po_file) == po_file and po_file.endswith('.po') \
+            and not po_file.startswith('.') and not po_file in ('django.po', 'djangojs.po')
+
+def get_app_catalogs(po_path):
+    """
+    Return the sorted list of the application catalogs found in ``po_path``.
+    """
+    if not os.path.exists(po_path):
+        return []
+    return sorted([f for f in os.listdir(po_path) if is_app_catalog(f)])
+
+def get_catalogs(po_path, lang_files):
+    """
+    Return a ``(catalogs, totals)`` tuple, ``catalogs`` being the list of
+    ``(file name, statistics)`` tuples of the ``lang_files`` catalogs and
+    ``totals`` the statistics of all of them (see :mod:`translations.stats`).
+    """
+    stats = get_catalog_stats(po_path, lang_files)
+    return [(f, stats.get(f)) for f in lang_files], get_total_stats(stats)
+
+def _json_response(data, status=200):
+    return HttpResponse(json.dumps(data), content_type='application/json', status=status)
 
 class GenerateTranslationMessagesView(TemplateView):
+    """
+    Submit a background job generating the messages of the language (see
+    :mod:`translations.jobs`) and return its state as JSON.
+    """
     template_name ='admin/includes/translation_messages_list.html'
 
     def get(self, request, *args, **kwargs):
@@ -28,153 +71,58 @@ class GenerateTranslationMessagesView(TemplateView):
 
         try:
             self.language = Language.objects.get(name=args[0])
-            self.locale = to_locale(self.language.name)
         except Language.DoesNotExist:
             raise Http404
         
-        if settings.LOCALE_PATHS:
-            #check if the folder for this language exists and attempt to create it if id does not exist
-            self.po_path = os.path.join(settings.LOCALE_PATHS[0], self.locale, 'LC_MESSAGES')
-            if not os.path.exists(self.po_path):
-                try:
-                    os.makedirs(self.po_path)
-                except:
-                    self.error = _('Could not create the target folder.')
-        else:
-            self.error = _('<b>Configuration error!</b> Please set the LOCALE_PATHS project setting to allow the creation of a unified messages catalog.')
-        
-        #delete files if requested
-        if request.GET.get('delete', 0):
-            for f in os.listdir(self.po_path):
-                if f.endswith('.po') or f.endswith('.mo'):
-                    os.unlink(os.path.join(self.po_path, f))
-        
-        context = self.get_context_data(**kwargs)
-        return self.render_to_response(context)
-    
-    def get_context_data(self, **kwargs):
-        context = super(GenerateTranslationMessagesView, self).get_context_data(**kwargs)
-        
-        if hasattr(self, 'error') and self.error:
-            context['error'] = self.error
-            return context
-        
-        #locate the current directory
-        curr_dir = os.curdir
-        domain_dict = {'django' : ['html','txt'], 'djangojs' : []}
-        
-        lang_files = []
-        #iterate over the installed applications and copy their po files
-        #for this language to the appropriate folder 
-        for app_name in settings.INSTALLED_APPS:    
-            
-            mod = import_module(app_name)
-            mod_root = os.path.dirname(mod.__file__)
-
-            if not os.path.exists(os.path.join(mod_root, 'locale')):
-                continue
-            
-            original_path = os.path.join(mod_root, 'locale',
-                                         to_locale(self.language.name),
-                                         'LC_MESSAGES')
-            delete_at_the_end = False
-            
-            if not os.path.exists(original_path):
-                if not app_name.startswith('django.contrib'):
-                    try: #try to create language directory for the app
-                        os.makedirs(original_path)
-                        delete_at_the_end = True
-                    except:
-                        continue
-                else:
-                    continue
-
-            if not app_name.startswith('django.contrib'):
-                #move original files to a temp file
-                for file_ in list(os.listdir(original_path)):
-                        if file_.endswith('.po'):
-                            shutil.copy(os.path.join(original_path, file_),
-                                        os.path.join(original_path,
-                                                     'original-%s' % file_))
-
-                #copy the project-wise files to the appropriate directory
-                if not self.request.GET.get('delete', 0):
-                    #replace original file with the yawd version
-                    #so that it gets updated
-                    for f in list(os.listdir(self.po_path)):
-                        if f.startswith('%s-' % app_name) and f.endswith('.po'):
-                            shutil.copy(os.path.join(self.po_path, f),
-                                        os.path.join(original_path,
-                                                     f.replace('%s-' % app_name, '')))  
-
-                #makemessages excluding the core applications
-                os.chdir(mod_root)
-                for key, value in domain_dict.items():
-                    try:
-                        management.call_command('makemessages', domain=key,
-                                                extensions=value, locale=self.locale,
-                                                verbosity=0)
-                    except management.CommandError:
-                        #Django could throw a CommandError if we process
-                        #the domainjs and there are no messages to process.
-                        pass
-                os.chdir(curr_dir)
-
-            #iterate over the application po files
-            for file_ in list(os.listdir(original_path)):
-                if not file_.startswith('original-') and file_.endswith('.po'):
-                    original_file_path = os.path.join(original_path, file_)
-                    file_name = '%s-%s' % (app_name, file_)
-                    
-                    #copy file
-                    copy_path = os.path.join(self.po_path, file_name)
-                    if self.request.GET.get('delete', 0) or \
-                            not (app_name.startswith('django.contrib') \
-                                 and os.path.exists(copy_path)):
-                        shutil.copy(original_file_path, copy_path)
-                        os.chmod(copy_path, 0664)
-
-                    #unlink updated file
-                    if not app_name.startswith('django.contrib'):
-                        os.unlink(original_file_path)
-
-                    lang_files.append(file_name)
-
-            if not app_name.startswith('django.contrib'):
-                if delete_at_the_end:
-                    shutil.rmtree(os.path.join(mod_root, 'locale',
-                                               to_locale(self.language.name)))
-                else:
-                    for file_ in os.listdir(original_path):
-                        #put back the original application files
-                        if file_.startswith('original-') and file_.endswith('.po'):
-                            shutil.move(os.path.join(original_path, file_),
-                                        os.path.join(original_path,
-                                                     file_.replace('original-','')))
-
-        #concat all messages in a single .po file for each domain
-        for domain in domain_dict:
-            file_name = '%s.po' % domain
-            uni_django_path = os.path.join(self.po_path, file_name)
-
-            if os.path.exists(uni_django_path):
-                os.unlink(uni_django_path)
-
-            source_files = [os.path.join(self.po_path, f) for f in lang_files \
-                            if f.endswith(file_name)]
-            if source_files:
-                #merge .po files
-                concat_message_files(source_files, uni_django_path)
-                #compile django.po
-                if not has_bom(uni_django_path):
-                    compile_message_file(uni_django_path)
-
-        #reset the cached translation messages so that
-        #we do not need to restart the web server
-        reset_translations(self.language.name)
-
-        context['lang_files'] = sorted(lang_files)
-        return context
+        if not settings.LOCALE_PATHS:
+            return self.render_to_response({'error' : _('<b>Configuration error!</b> Please set the LOCALE_PATHS project setting to allow the creation of a unified messages catalog.')})
+
+        try:
+            job = submit_job(self.language.name, bool(request.GET.get('delete', 0)))
+        except OSError:
+            return self.render_to_response({'error' : _('Could not create the target folder.')})
+        except JobConflictError:
+            return self.render_to_response({'error' : _('The messages of this language are already being generated. Please try again when the generation finishes.')})
+        return _json_response(job)
+
+
+class GenerationStatusView(TemplateView):
+    """
+    Return the state of the last messages generation job of the language
+    as JSON. Once the job is finished, the ``html`` key holds the
+    rendered list of the generated files.
+    """
+    template_name ='admin/includes/translation_messages_list.html'
+
+    def get(self, request, *args, **kwargs):
+
+        if not request.is_ajax():
+            raise Http404
+
+        if not request.user.has_perm('translations.edit_translations'):
+            raise PermissionDenied
+
+        try:
+            self.language = Language.objects.get(name=args[0])
+        except Language.DoesNotExist:
+            raise Http404
+
+        job = get_job(self.language.name) if settings.LOCALE_PATHS else None
+        if job is None:
+            raise Http404
+
+        if job['status'] in ('done', 'failed'):
+            context = self.get_context_data(**kwargs)
+            context['lang_files'] = job.get('lang_files', [])
+            context['catalogs'], context['totals'] = get_catalogs(get_po_path(self.language.name),
+                                                                  context['lang_files'])
+            if job['errors']:
+                context['error'] = (_('The messages could not be compiled:') if job['status'] == 'done' \
+                                    else _('The messages could not be generated:')) + '<br />' + \
+                    '<br />'.join([escape(l) for e in job['errors'] for l in e.splitlines()])
+            job['html'] = render_to_string(self.template_name, context,
+                                           context_instance=RequestContext(request))
+        return _json_response(job)
 
 
 class TranslationMessagesView(TemplateView):
@@ -213,13 +161,12 @@ class TranslationMessagesView(TemplateView):
                                  'creation of a unified messages catalog.')
             return context
 
-        context['lang_files'] = []
         po_path = os.path.join(settings.LOCALE_PATHS[0], self.locale, 'LC_MESSAGES')
-        if os.path.exists(po_path):
-            for file_ in os.listdir(po_path):
-                if file_.endswith('.po') and not file_ in ['django.po', 'djangojs.po']:
-                    context['lang_files'].append(file_)
-            context['lang_files'].sort()
+        context['lang_files'] = get_app_catalogs(po_path)
+        context['catalogs'], context['totals'] = get_catalogs(po_path, context['lang_files'])
+
+        job = get_job(self.language.name)
+        context['job_running'] = job is not None and job['status'] in ('pending', 'running')
 
         if not os.path.exists(po_path) or not context['lang_files']:
             context['warning'] = _('The system does not appear to have any '\
@@ -229,6 +176,78 @@ class TranslationMessagesView(TemplateView):
         return context
 
 
+class TranslationMessagesBrowseView(TemplateView):
+    """
+    Browse the messages of all the application catalogs of a language,
+    with pagination, status filters and substring search (see
+    :mod:`translations.browser`).
+    """
+    template_name = 'admin/browse_translation_messages.html'
+    paginate_by = 50
+
+    def get(self, request, *args, **kwargs):
+
+        if not request.user.has_perm('translations.view_translations'):
+            raise PermissionDenied
+
+        try:
+            self.language = Language.objects.get(name=args[0])
+        except Language.DoesNotExist:
+            raise Http404
+
+        if not settings.LOCALE_PATHS:
+            raise Http404
+
+        context = self.get_context_data(**kwargs)
+        return self.render_to_response(context)
+
+    def get_context_data(self, **kwargs):
+        context = super(TranslationMessagesBrowseView, self).get_context_data(**kwargs)
+
+        opts = self.language._meta
+        context['title'] = _('Browse Static Messages')
+        context['language'] = self.language
+        context['opts'] = opts
+        context['has_change_permission'] = self.request.user.has_perm(opts.app_label + '.' + opts.get_change_permission())
+        context['has_change_object_permission'] = self.request.user.has_perm(opts.app_label + '.' + opts.get_change_permission(), self.language.pk)
+
+        po_path = os.path.join(settings.LOCALE_PATHS[0], to_locale(self.language.name), 'LC_MESSAGES')
+        lang_files = get_app_catalogs(po_path)
+
+        query = self.request.GET.get('q', '').strip()
+        status = self.request.GET.get('status', '')
+        if not status in (UNTRANSLATED, FUZZY, CHANGED):
+            status = ''
+        po_file = self.request.GET.get('file', '')
+        if not po_file in lang_files:
+            po_file = ''
+
+        results = get_catalog_index(po_path, lang_files).search(query, status, po_file)
+        paginator = Paginator(results, self.paginate_by)
+        try:
+            page = paginator.page(self.request.GET.get('page', 1))
+        except PageNotAnInteger:
+            page = paginator.page(1)
+        except EmptyPage:
+            page = paginator.page(paginator.num_pages)
+
+        params = self.request.GET.copy()
+        params.pop('page', None)
+
+        context.update({
+            'lang_files' : lang_files,
+            'query' : query,
+            'status' : status,
+            'po_file' : po_file,
+            'statuses' : ((UNTRANSLATED, _('Untranslated')), (FUZZY, _('Fuzzy')),
+                          (CHANGED, _('Changed'))),
+            'paginator' : paginator,
+            'page_obj' : page,
+            'querystring' : params.urlencode(),
+        })
+        return context
+
+
 class TranslationMessagesEditView(FormView):
     template_name = 'admin/edit_translation_messages.html'
     form_class = PoFileForm
@@ -266,6 +285,8 @@ class TranslationMessagesEditView(FormView):
             raise Http404
 
         self.po_file = self.args[1]
+        if not is_app_catalog(self.po_file):
+            raise Http404
 
         try:
             file_ = open(os.path.join(self.po_path, self.po_file), 'r')
@@ -301,34 +322,19 @@ class TranslationMessagesEditView(FormView):
         try:
             file_path = os.path.join(self.po_path, self.po_file)
 
-            file_ = open(file_path, 'w+')
-            file_.write(smart_str(form.cleaned_data['po_content']))
-            file_.close()
-
-            domain = 'django.po' if self.po_file.endswith('django.po') \
-                                                    else 'djangojs.po'
-            uni_django_path = os.path.join(self.po_path, domain)
-            source_files = []
-
-            #iterate over the installed applications, locate & concat 
-            #the corresponding global django.po or djangojs.po file
-            for app_name in settings.INSTALLED_APPS:
-                local_django = os.path.join(self.po_path, '%s-%s' % (app_name, domain))
-                if os.path.exists(local_django):
-                    source_files.append(local_django)
+            with file_lock(file_path):
+                write_file(file_path, smart_str(form.cleaned_data['po_content']))
 
-            concat_message_files(source_files, uni_django_path)
-
-            if not has_bom(uni_django_path):
-                compile_message_file(uni_django_path)
-
-            #reset the cached translation messages so that
-            #we do not need to restart the web server
-            reset_translations(self.language.name)
+            #concat & compile the corresponding global django.po or djangojs.po file
+            update_unified_catalog(self.language.name, self.po_path, get_domain(self.po_file))
 
             messages.add_message(self.request, messages.SUCCESS,
                                  _(('The file %(file)s was succesfuly updated.' \
                                     % { 'file' : self.po_file })))
+        except POFileError, e:
+            messages.add_message(self.request, messages.ERROR,
+                                 _('The messages could not be compiled: %(errors)s') % \
+                                    { 'errors' : unicode(e) })
         except:
             messages.add_message(self.request, messages.ERROR,
                                  _(('The file %(file)s could not be saved.' \
@@ -339,4 +345,96 @@ class TranslationMessagesEditView(FormView):
             return HttpResponseRedirect('../%s' % self.po_file)
 
         return super(TranslationMessagesEditView, self).form_valid(form)
-        
\ No newline at end of file
+        
+
+class TranslationMessageEntryView(View):
+    """
+    Read (GET) or update (POST) a single message of an application catalog
+    as JSON, without transferring the whole file. The message is identified
+    by the ``msgid`` and (optional, non empty) ``msgctxt`` parameters.
+    Updates accept the ``msgstr`` (or the ``msgstr_plural`` list) and
+    ``fuzzy`` parameters.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+
+        permission = 'translations.edit_translations' if request.method == 'POST' \
+                        else 'translations.view_translations'
+        if not request.user.has_perm(permission):
+            raise PermissionDenied
+
+        try:
+            self.language = Language.objects.get(name=args[0])
+        except Language.DoesNotExist:
+            raise Http404
+
+        self.po_file = args[1]
+        if not settings.LOCALE_PATHS or not is_app_catalog(self.po_file):
+            raise Http404
+
+        self.po_path = os.path.join(settings.LOCALE_PATHS[0],
+                                    to_locale(self.language.name), 'LC_MESSAGES')
+        self.file_path = os.path.join(self.po_path, self.po_file)
+        if not os.path.exists(self.file_path):
+            raise Http404
+
+        return super(TranslationMessageEntryView, self).dispatch(request, *args, **kwargs)
+
+    def get_entry(self, params):
+        try:
+            entry = read_entry(self.file_path, (params.get('msgctxt') or None, params.get('msgid')))
+        except POFileError:
+            entry = None
+        if entry is None:
+            raise Http404
+        return entry
+
+    def serialize(self, entry):
+        return {
+            'msgctxt' : entry.msgctxt,
+            'msgid' : entry.msgid,
+            'msgid_plural' : entry.msgid_plural,
+            'msgstr' : entry.msgstr,
+            'msgstr_plural' : entry.msgstr_plural,
+            'fuzzy' : entry.fuzzy,
+            'flags' : entry.flags,
+            'comments' : entry.comments,
+        }
+
+    def get(self, request, *args, **kwargs):
+        return _json_response(self.serialize(self.get_entry(request.GET)))
+
+    def post(self, request, *args, **kwargs):
+        entry = self.get_entry(request.POST)
+
+        if entry.msgid_plural is not None:
+            msgstr_plural = request.POST.getlist('msgstr_plural')
+            if len(msgstr_plural) != len(entry.msgstr_plural):
+                return _json_response({'errors' : [_('Please provide all plural forms.')]}, 400)
+            entry.msgstr_plural = msgstr_plural
+        else:
+            entry.msgstr = request.POST.get('msgstr', u'')
+
+        fuzzy = request.POST.get('fuzzy', '') in ('1', 'true', 'on')
+        if fuzzy != entry.fuzzy:
+            entry.flags = [f for f in entry.flags if f != 'fuzzy'] + (['fuzzy'] if fuzzy else [])
+            #the previous msgid is not needed once the message is reviewed
+            entry.comments = [c for c in entry.comments if not c.startswith(u'#,') \
+                              and not (not fuzzy and c.startswith(u'#|'))]
+            if entry.flags:
+                #flags precede the previous msgid comments
+                position = len([c for c in entry.comments if not c.startswith(u'#|')])
+                entry.comments.insert(position, u'#, %s' % ', '.join(entry.flags))
+
+        errors = check_format(entry)
+        if errors:
+            return _json_response({'errors' : errors}, 400)
+
+        try:
+            write_entry(self.file_path, entry)
+            update_unified_entry(self.language.name, self.po_path, get_domain(self.po_file),
+                                 self.po_file, entry)
+        except POFileError, e:
+            return _json_response({'errors' : unicode(e).splitlines()}, 400)
+
+        return _json_response(self.serialize(entry))